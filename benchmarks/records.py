@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Deterministic generator of synthetic HEP records for the benchmarks.
+
+The records follow the ``hep`` schema of ``inspire-schemas``, and the triples
+are shaped so that ``api.get_configuration`` picks the configuration they are
+generated for, with the kind of differences between root, head and update
+seen in production: new arXiv versions, curated authors and references,
+publisher metadata, errata and manual merges.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+import random
+import uuid
+
+from six import string_types
+
+from inspire_json_merger.config import (
+    ArxivOnArxivOperations,
+    ArxivOnPublisherOperations,
+    ErratumOnPublisherOperations,
+    GrobidOnArxivAuthorsOperations,
+    ManualMergeOperations,
+    PublisherOnArxivOperations,
+    PublisherOnPublisherOperations,
+)
+
+SIZES = {
+    'small': {
+        'authors': 5,
+        'affiliations': 3,
+        'references': 30,
+        'documents': 1,
+        'figures': 5,
+    },
+    'medium': {
+        'authors': 50,
+        'affiliations': 20,
+        'references': 150,
+        'documents': 2,
+        'figures': 20,
+    },
+    'large': {
+        'authors': 1000,
+        'affiliations': 150,
+        'references': 500,
+        'documents': 3,
+        'figures': 60,
+    },
+    'collaboration': {
+        'authors': 3000,
+        'affiliations': 200,
+        'references': 300,
+        'documents': 2,
+        'figures': 40,
+    },
+}
+
+_SYLLABLES = [
+    'ba', 'ce', 'di', 'fo', 'gu', 'ha', 'ke', 'li', 'mo', 'nu', 'pa', 're',
+    'si', 'to', 'vu', 'za', 'bre', 'chi', 'dro', 'fla', 'gri', 'klo', 'mar',
+    'nor', 'pet', 'ros', 'sta', 'tin', 'vol', 'wen',
+]
+_INITIALS = 'ABCDEFGHIJKLMNOPRSTVWZ'
+_INSTITUTIONS = [
+    'CERN', 'DESY', 'Fermilab', 'SLAC', 'KEK', 'INFN, Rome', 'LAL, Orsay',
+    'Oxford U.', 'Harvard U.', 'Tokyo U.', 'Warsaw U.', 'Zurich, ETH',
+]
+_JOURNALS = [
+    'Phys.Rev.D', 'Phys.Lett.B', 'JHEP', 'Eur.Phys.J.C', 'Nucl.Phys.B',
+    'Astrophys.J.',
+]
+_WORDS = [
+    'measurement', 'search', 'boson', 'decay', 'collisions', 'cross',
+    'section', 'symmetry', 'lattice', 'neutrino', 'dark', 'matter',
+    'scattering', 'polarization', 'gravitational', 'waves', 'quark',
+]
+
+
+def generate_triple(configuration, size='medium', seed=0):
+    """Generate a ``(root, head, update)`` triple merged with a configuration.
+
+    Args:
+        configuration (type): one of the configurations of ``config.py``.
+        size (Union[str, dict]): a key of ``SIZES``, or a dict with the same
+            keys giving the number of elements of every kind.
+        seed (int): the seed of the generator, the same seed always gives
+            the same triple.
+
+    Returns:
+        tuple: ``(root, head, update)``.
+    """
+    sizes = SIZES[size] if isinstance(size, string_types) else size
+    rng = random.Random(seed)
+    generator = _TRIPLE_GENERATORS[configuration]
+    return generator(rng, sizes)
+
+
+def generate_record(rng, sizes, source='arXiv'):
+    """Generate an arXiv record with the given numbers of elements."""
+    affiliations = [_institution(rng) for _ in range(max(sizes['affiliations'], 1))]
+    arxiv_id = '%04d.%05d' % (rng.randint(1001, 2412), rng.randint(0, 99999))
+    record = {
+        '$schema': 'https://inspirehep.net/schemas/records/hep.json',
+        '_collections': ['Literature'],
+        'document_type': ['article'],
+        'titles': [{'title': _sentence(rng, 8).capitalize(), 'source': source}],
+        'abstracts': [{'value': _sentence(rng, 60), 'source': source}],
+        'arxiv_eprints': [{'value': arxiv_id, 'categories': ['hep-ex']}],
+        'acquisition_source': {
+            'method': 'hepcrawl',
+            'source': source,
+            'datetime': '2020-01-01T00:00:00.000000',
+        },
+        'authors': [
+            _author(rng, affiliations, index) for index in range(sizes['authors'])
+        ],
+        'references': [_reference(rng) for _ in range(sizes['references'])],
+        'documents': [
+            _document(rng, source, index) for index in range(sizes['documents'])
+        ],
+        'figures': [_figure(rng, source, index) for index in range(sizes['figures'])],
+        'citeable': True,
+    }
+    return record
+
+
+def _arxiv_on_arxiv(rng, sizes):
+    root = generate_record(rng, sizes)
+    head = _curate(rng, root)
+    update = _new_arxiv_version(rng, root)
+    return root, head, update
+
+
+def _publisher_on_arxiv(rng, sizes):
+    root = generate_record(rng, sizes)
+    head = _curate(rng, root)
+    update = _publisher_version(rng, root)
+    return {}, head, update
+
+
+def _arxiv_on_publisher(rng, sizes):
+    root = _publisher_version(rng, generate_record(rng, sizes))
+    head = _curate(rng, root)
+    update = _new_arxiv_version(rng, generate_record(rng, sizes, 'arXiv'))
+    update['arxiv_eprints'] = copy.deepcopy(head['arxiv_eprints'])
+    update['authors'] = _edit_authors(rng, head['authors'])
+    return root, head, update
+
+
+def _publisher_on_publisher(rng, sizes):
+    root = _publisher_version(rng, generate_record(rng, sizes))
+    head = _curate(rng, root)
+    update = copy.deepcopy(root)
+    update['authors'] = _edit_authors(rng, update['authors'])
+    update['references'].append(_reference(rng))
+    update['publication_info'][0]['page_end'] = str(rng.randint(100, 200))
+    return root, head, update
+
+
+def _erratum_on_publisher(rng, sizes):
+    root, head, update = _publisher_on_publisher(rng, sizes)
+    update['titles'] = [
+        {'title': 'Erratum: ' + head['titles'][0]['title'], 'source': 'Elsevier'}
+    ]
+    update['dois'][0]['material'] = 'erratum'
+    return root, head, update
+
+
+def _manual_merge(rng, sizes):
+    head = _curate(rng, generate_record(rng, sizes))
+    update = _curate(rng, generate_record(rng, sizes))
+    head['control_number'] = rng.randint(1, 999999)
+    update['control_number'] = head['control_number'] + 1
+    return {}, head, update
+
+
+def _grobid_on_arxiv_authors(rng, sizes):
+    head = {'authors': generate_record(rng, sizes)['authors']}
+    update = {'authors': _edit_authors(rng, head['authors'])}
+    for author in update['authors']:
+        author.pop('ids', None)
+        author.pop('uuid', None)
+        author.pop('signature_block', None)
+        author.pop('affiliations', None)
+    return {}, head, update
+
+
+_TRIPLE_GENERATORS = {
+    ArxivOnArxivOperations: _arxiv_on_arxiv,
+    PublisherOnArxivOperations: _publisher_on_arxiv,
+    ArxivOnPublisherOperations: _arxiv_on_publisher,
+    PublisherOnPublisherOperations: _publisher_on_publisher,
+    ErratumOnPublisherOperations: _erratum_on_publisher,
+    ManualMergeOperations: _manual_merge,
+    GrobidOnArxivAuthorsOperations: _grobid_on_arxiv_authors,
+}
+
+CONFIGURATIONS = sorted(_TRIPLE_GENERATORS, key=lambda config: config.__name__)
+
+
+def _curate(rng, record):
+    """Return a copy of ``record`` as edited by curators."""
+    record = copy.deepcopy(record)
+    record['control_number'] = rng.randint(1, 999999)
+    record['curated'] = True
+    for author in rng.sample(record['authors'], len(record['authors']) // 10):
+        author['full_name'] = author['full_name'].replace('.', '. ', 1).strip()
+    for reference in rng.sample(
+        record['references'], len(record['references']) // 20
+    ):
+        reference['legacy_curated'] = True
+        reference['record'] = {
+            '$ref': 'https://inspirehep.net/api/literature/%d'
+            % rng.randint(1, 999999)
+        }
+    return record
+
+
+def _new_arxiv_version(rng, record):
+    """Return a copy of ``record`` as harvested from a new arXiv version."""
+    record = copy.deepcopy(record)
+    record['authors'] = _edit_authors(rng, record['authors'])
+    record['references'].extend(_reference(rng) for _ in range(3))
+    for index, document in enumerate(record['documents']):
+        document['key'] = 'v2-%d.pdf' % index
+        document['url'] = 'https://arxiv.org/pdf/v2-%d' % index
+    record['titles'][0]['title'] += ' (v2)'
+    return record
+
+
+def _publisher_version(rng, record):
+    """Return a copy of ``record`` as harvested from a publisher."""
+    record = copy.deepcopy(record)
+    source = 'Elsevier'
+    record['acquisition_source']['source'] = source
+    record['titles'] = [{'title': record['titles'][0]['title'], 'source': source}]
+    record['abstracts'] = [{'value': _sentence(rng, 60), 'source': source}]
+    record['dois'] = [
+        {
+            'value': '10.1016/j.physletb.%d' % rng.randint(1000, 9999),
+            'source': source,
+            'material': 'publication',
+        }
+    ]
+    record['publication_info'] = [
+        {
+            'journal_title': rng.choice(_JOURNALS),
+            'journal_volume': str(rng.randint(1, 900)),
+            'page_start': str(rng.randint(1, 99)),
+            'year': rng.randint(1990, 2024),
+            'material': 'publication',
+        }
+    ]
+    record['documents'] = [
+        _document(rng, source, index) for index in range(len(record['documents']))
+    ]
+    record['figures'] = [
+        _figure(rng, source, index) for index in range(len(record['figures']))
+    ]
+    record['authors'] = _edit_authors(rng, record['authors'])
+    return record
+
+
+def _edit_authors(rng, authors):
+    """Return a copy of ``authors`` with changes a new version would have."""
+    authors = copy.deepcopy(authors)
+    for author in rng.sample(authors, len(authors) // 5):
+        author['raw_affiliations'] = [{'value': _institution(rng) + ', Physics Dept.'}]
+    for author in rng.sample(authors, len(authors) // 10):
+        given = author['full_name'].split(', ')[-1]
+        author['full_name'] = author['full_name'].replace(
+            given, _name(rng).capitalize()
+        )
+    return authors
+
+
+def _author(rng, affiliations, index):
+    full_name = '%s, %s.' % (_last_name(rng), rng.choice(_INITIALS))
+    author = {
+        'full_name': full_name,
+        'uuid': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        'affiliations': [{'value': rng.choice(affiliations)}],
+        'raw_affiliations': [{'value': rng.choice(affiliations) + ', Geneva'}],
+    }
+    if rng.random() < 0.6:
+        author['ids'] = [
+            {
+                'schema': 'INSPIRE BAI',
+                'value': '%s.%s.%d'
+                % (full_name[-2], full_name.split(',')[0].replace(' ', '.'), index),
+            }
+        ]
+    if rng.random() < 0.3:
+        author.setdefault('ids', []).append(
+            {'schema': 'ORCID', 'value': _orcid(rng)}
+        )
+    return author
+
+
+def _orcid(rng):
+    # In the block of ISNI numbers assigned to ORCID.
+    digits = '%015d' % rng.randint(15000000, 34999999)
+    total = 0
+    for digit in digits:
+        total = (total + int(digit)) * 2
+    check = (12 - total % 11) % 11
+    digits += 'X' if check == 10 else str(check)
+    return '-'.join(digits[i:i + 4] for i in range(0, 16, 4))
+
+
+def _reference(rng):
+    first_author = '%s, %s.' % (_last_name(rng), rng.choice(_INITIALS))
+    journal = rng.choice(_JOURNALS)
+    volume = str(rng.randint(1, 900))
+    page = str(rng.randint(1, 9999))
+    year = rng.randint(1970, 2024)
+    return {
+        'raw_refs': [
+            {
+                'schema': 'text',
+                'value': '%s et al., %s %s (%d) %s'
+                % (first_author, journal, volume, year, page),
+            }
+        ],
+        'reference': {
+            'authors': [{'full_name': first_author}],
+            'publication_info': {
+                'journal_title': journal,
+                'journal_volume': volume,
+                'page_start': page,
+                'year': year,
+            },
+        },
+    }
+
+
+def _document(rng, source, index):
+    return {
+        'key': '%s-%d.pdf' % (source.lower(), index),
+        'url': 'https://example.org/%s/%d/%d.pdf'
+        % (source.lower(), rng.randint(0, 99999), index),
+        'source': source,
+        'fulltext': index == 0,
+    }
+
+
+def _figure(rng, source, index):
+    return {
+        'key': '%s-figure-%d.png' % (source.lower(), index),
+        'url': 'https://example.org/%s/figures/%d.png' % (source.lower(), index),
+        'source': source,
+        'caption': _sentence(rng, 20),
+    }
+
+
+def _institution(rng):
+    return rng.choice(_INSTITUTIONS)
+
+
+def _last_name(rng):
+    name = _name(rng).capitalize()
+    if rng.random() < 0.1:
+        name += ' ' + _name(rng).capitalize()
+    return name
+
+
+def _name(rng):
+    return ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(_WORDS) for _ in range(words))
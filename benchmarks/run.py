@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Benchmark ``api.merge`` on synthetic records of every configuration.
+
+Run it from the root of the repository, no network access is needed::
+
+    python benchmarks/run.py --size small --size large --repeat 10
+
+For every configuration and size it reports the throughput, the latency
+percentiles and the peak memory allocated by a merge. ``--json`` also writes
+the results to a file, to compare them between two revisions.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import math
+import sys
+from timeit import default_timer
+
+from records import CONFIGURATIONS, SIZES, generate_triple
+
+from inspire_json_merger.api import merge
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 can't trace the allocations.
+    tracemalloc = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '-s',
+        '--size',
+        action='append',
+        choices=sorted(SIZES),
+        help='size of the records, can be repeated (default: small and medium)',
+    )
+    parser.add_argument(
+        '-c',
+        '--configuration',
+        action='append',
+        choices=[configuration.__name__ for configuration in CONFIGURATIONS],
+        help='configuration to benchmark, can be repeated (default: all)',
+    )
+    parser.add_argument(
+        '-n',
+        '--repeat',
+        type=int,
+        default=20,
+        help='number of different triples merged per benchmark (default: 20)',
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0, help='seed of the first triple (default: 0)'
+    )
+    parser.add_argument(
+        '--no-memory',
+        action='store_true',
+        help="don't measure the peak memory, which needs an extra merge",
+    )
+    parser.add_argument(
+        '--json', type=argparse.FileType('w'), help='file to write the results to'
+    )
+    args = parser.parse_args(argv)
+
+    sizes = args.size or ['small', 'medium']
+    configurations = [
+        configuration
+        for configuration in CONFIGURATIONS
+        if not args.configuration or configuration.__name__ in args.configuration
+    ]
+    measure_memory = tracemalloc is not None and not args.no_memory
+
+    results = []
+    print(_format_row(_HEADER))
+    for size in sizes:
+        for configuration in configurations:
+            result = run_benchmark(
+                configuration, size, args.repeat, args.seed, measure_memory
+            )
+            results.append(result)
+            print(_format_row(result))
+            sys.stdout.flush()
+
+    if args.json:
+        json.dump(results, args.json, indent=2, sort_keys=True)
+
+
+def run_benchmark(configuration, size, repeat, seed=0, measure_memory=True):
+    """Merge ``repeat`` generated triples and summarize how long it took.
+
+    Returns:
+        dict: the throughput in merges per second, the latency percentiles in
+        milliseconds and, if ``measure_memory`` is set, the peak memory of the
+        first merge in MiB.
+    """
+    triples = [
+        generate_triple(configuration, size, seed + index) for index in range(repeat)
+    ]
+    # Warm up the caches and the lazy imports before measuring.
+    merge(*triples[0], configuration=configuration)
+
+    latencies = []
+    for triple in triples:
+        start = default_timer()
+        merge(*triple, configuration=configuration)
+        latencies.append(default_timer() - start)
+
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            merge(*triples[0], configuration=configuration)
+            peak_memory = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'configuration': configuration.__name__,
+        'size': size,
+        'merges': repeat,
+        'throughput': repeat / sum(latencies),
+        'p50': 1000 * _percentile(latencies, 50),
+        'p90': 1000 * _percentile(latencies, 90),
+        'p99': 1000 * _percentile(latencies, 99),
+        'max': 1000 * latencies[-1],
+        'peak_memory': peak_memory,
+    }
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of a sorted list."""
+    rank = int(math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+_HEADER = {
+    'configuration': 'configuration',
+    'size': 'size',
+    'throughput': 'merges/s',
+    'p50': 'p50 ms',
+    'p90': 'p90 ms',
+    'p99': 'p99 ms',
+    'max': 'max ms',
+    'peak_memory': 'peak MiB',
+}
+
+
+def _format_row(row):
+    def number(key):
+        value = row[key]
+        if isinstance(value, float):
+            return '%10.2f' % value
+        return '%10s' % ('-' if value is None else value)
+
+    return '%-32s %-14s %s' % (
+        row['configuration'],
+        row['size'],
+        ' '.join(
+            number(key)
+            for key in ('throughput', 'p50', 'p90', 'p99', 'max', 'peak_memory')
+        ),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Benchmark the memory used by the tokens of the author names.
+
+Run it from the root of the repository::
+
+    python benchmarks/tokens.py --size collaboration
+
+The names of the authors of a generated triple are tokenized like the
+``AuthorComparator`` does, starting from an empty ``author_tokenize`` cache.
+It reports the memory still allocated by the tokens afterwards, the peak
+memory and the time it took. Python 3 is needed to trace the allocations.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import gc
+import tracemalloc
+from timeit import default_timer
+
+from json_merger.contrib.inspirehep.author_util import _asciify, _decode_if_not_unicode
+from records import SIZES, generate_triple
+
+from inspire_json_merger.comparators import author_tokenize
+from inspire_json_merger.config import ArxivOnArxivOperations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '-s',
+        '--size',
+        choices=sorted(SIZES),
+        default='collaboration',
+        help='size of the records (default: collaboration)',
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0, help='seed of the triple (default: 0)'
+    )
+    args = parser.parse_args(argv)
+
+    names = get_names(generate_triple(ArxivOnArxivOperations, args.size, args.seed))
+    result = run_benchmark(names)
+    print('names:           %d (%d distinct)' % (len(names), len(set(names))))
+    print('retained memory: %.2f MiB' % result['retained_memory'])
+    print('peak memory:     %.2f MiB' % result['peak_memory'])
+    print('time:            %.2f ms' % result['time'])
+
+
+def get_names(triple):
+    """The names tokenized when matching the authors of a triple.
+
+    Both the names and their ASCII versions are tokenized, by the
+    normalization functions and the distance function.
+    """
+    names = []
+    for record in triple:
+        for author in record.get('authors', []):
+            if 'full_name' not in author:
+                continue
+            name = _decode_if_not_unicode(author['full_name'])
+            names.extend([name, _asciify(name)])
+    return names
+
+
+def run_benchmark(names):
+    """Tokenize the names with an empty cache, keeping the tokens alive.
+
+    Returns:
+        dict: the memory still allocated after tokenizing and the peak
+        memory in MiB, and the time it took in milliseconds.
+    """
+    author_tokenize.cache.clear()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = default_timer()
+        tokens = [author_tokenize(name) for name in names]
+        duration = default_timer() - start
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del tokens
+    author_tokenize.cache.clear()
+    return {
+        'retained_memory': retained / 2**20,
+        'peak_memory': peak / 2**20,
+        'time': 1000 * duration,
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Asyncio wrappers running merges off the event loop (Python 3.7+ only).
+
+Both functions are also available from ``inspire_json_merger.api``.
+"""
+
+import asyncio
+import os
+import traceback
+from collections import deque
+from functools import partial
+
+from inspire_json_merger import api
+
+
+async def merge_async(
+    root,
+    head,
+    update,
+    head_source=None,
+    configuration=None,
+    stats=None,
+    executor=None,
+    timeout=None,
+    **merge_kwargs
+):
+    """Run ``api.merge`` in an executor without blocking the event loop.
+
+    Args:
+        root (dict): the last common parent json of head and update.
+        head (dict): the last version of a record in INSPIRE.
+        update (dict): the update coming from outside INSPIRE to merge.
+        head_source (str): the source of the head record, see ``api.merge``.
+        configuration: the configuration to use, see ``api.merge``.
+        stats (dict): filled as by ``api.merge``, also when the merge runs
+            in another process.
+        executor (concurrent.futures.Executor): where to run the merge. If
+            ``None``, the default executor of the loop is used, which is a
+            thread pool: the loop stays responsive, but merges don't run in
+            parallel because of the GIL. Pass a ``ProcessPoolExecutor`` to
+            use several cores.
+        timeout (float): seconds after which ``asyncio.TimeoutError`` is
+            raised. If ``None``, wait for the merge to finish. The time is
+            counted from the submission to the executor, so it includes the
+            time spent waiting for a free worker.
+        merge_kwargs: the other arguments of ``api.merge``, e.g. ``fields``.
+            ``reference_fingerprints`` is updated as by ``api.merge``, also
+            when the merge runs in another process.
+
+    Returns:
+        tuple: the merged record and the list of conflicts.
+
+    Note:
+        On cancellation or timeout, a merge that didn't start yet is dropped,
+        but one that is already running can't be interrupted: it finishes in
+        the executor and its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        executor,
+        partial(
+            _merge_with_stats,
+            root,
+            head,
+            update,
+            head_source,
+            configuration,
+            stats is not None,
+            **merge_kwargs
+        ),
+    )
+    merged, conflicts, merge_stats, fingerprints = await asyncio.wait_for(
+        future, timeout
+    )
+    if stats is not None:
+        stats.update(merge_stats)
+    reference_fingerprints = merge_kwargs.get('reference_fingerprints')
+    if reference_fingerprints is not None:
+        reference_fingerprints.update(fingerprints)
+    return merged, conflicts
+
+
+def _merge_with_stats(
+    root, head, update, head_source, configuration, with_stats, **merge_kwargs
+):
+    # Return the stats and the reference fingerprints instead of filling the
+    # caller's dicts, which aren't shared with a worker process.
+    stats = {} if with_stats else None
+    merged, conflicts = api.merge(
+        root, head, update, head_source, configuration, stats=stats, **merge_kwargs
+    )
+    return merged, conflicts, stats, merge_kwargs.get('reference_fingerprints')
+
+
+async def merge_many_async(
+    triples, executor=None, timeout=None, concurrency=None, ordered=True
+):
+    """Merge many records, running at most ``concurrency`` merges at a time.
+
+    Args:
+        triples (iterable): tuples of the form ``(root, head, update)`` or
+            ``(root, head, update, head_source)``, consumed lazily.
+        executor (concurrent.futures.Executor): see ``merge_async``.
+        timeout (float): timeout in seconds of every single merge. As it
+            includes the time waiting for a free worker, ``concurrency``
+            should not be higher than the number of workers of the executor
+            when a timeout is used.
+        concurrency (int): maximum number of merges submitted to the executor
+            at the same time. If ``None``, the number of CPUs is used.
+        ordered (bool): if ``True``, results are yielded in input order,
+            otherwise as soon as they are ready.
+
+    Yields:
+        api.MergeResult: as for ``api.merge_many``, a merge that raised or
+        timed out is reported in the ``error`` of its result and doesn't
+        stop the others.
+    """
+    concurrency = concurrency or os.cpu_count()
+    pending = deque() if ordered else set()
+    try:
+        for index, triple in enumerate(triples):
+            task = asyncio.ensure_future(
+                _merge_item_async(index, triple, executor, timeout)
+            )
+            if ordered:
+                pending.append(task)
+                if len(pending) >= concurrency:
+                    yield await pending.popleft()
+            else:
+                pending.add(task)
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield task.result()
+        if ordered:
+            while pending:
+                yield await pending.popleft()
+        else:
+            for task in asyncio.as_completed(pending):
+                yield await task
+            pending = set()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _merge_item_async(index, triple, executor, timeout):
+    try:
+        merged, conflicts = await merge_async(
+            *triple, executor=executor, timeout=timeout
+        )
+    except Exception:
+        return api.MergeResult(index, None, None, traceback.format_exc())
+    return api.MergeResult(index, merged, conflicts, None)
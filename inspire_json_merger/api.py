@@ -22,9 +22,19 @@
 
 from __future__ import absolute_import, division, print_function
 
+import copy
+import multiprocessing
+import re
+import traceback
+from collections import Counter, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import islice
+from timeit import default_timer
+
 from inspire_utils.helpers import force_list
-from inspire_utils.record import get_value
-from json_merger.merger import MergeError, Merger
+from json_merger.merger import MergeError
+from six import PY2
 
 from inspire_json_merger.config import (
     ArxivOnArxivOperations,
@@ -34,11 +44,65 @@ from inspire_json_merger.config import (
     PublisherOnArxivOperations,
     PublisherOnPublisherOperations,
 )
-from inspire_json_merger.postprocess import postprocess_results
-from inspire_json_merger.utils import filter_conflicts, filter_records
+from inspire_json_merger.plan import get_merge_plan
+from inspire_json_merger.postprocess import AuthorPositions, postprocess_results
+from inspire_json_merger.pre_filters import (
+    get_reference_fingerprints,
+    get_references_digest,
+)
+from inspire_json_merger.utils import split_unchanged_fields
+
+try:
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    # The Python 2 backport of ``concurrent.futures`` doesn't detect dead
+    # workers.
+    BrokenProcessPool = RuntimeError
+
+# Fields whose number of elements is reported in the ``stats`` of ``merge``.
+STATS_SIZE_FIELDS = ('authors', 'references', 'documents', 'figures')
+
+# Number of merges short-circuited by ``merge`` in this process, by reason.
+NOOP_MERGES = Counter()
+
+# Words in the title of an update telling that it's an erratum.
+ERRATUM_KEYWORDS = (
+    'erratum',
+    'corrigendum',
+    "publisher's note",
+    'publisher correction',
+    'author correction',
+)
+_ERRATUM_KEYWORDS_RE = re.compile('|'.join(map(re.escape, ERRATUM_KEYWORDS)))
+_CORRECTION_TO_RE = re.compile('correction to:', re.IGNORECASE)
+
+RecordClassification = namedtuple(
+    'RecordClassification', ['head_source', 'update_source', 'manual_merge', 'erratum']
+)
+
+MergeResult = namedtuple('MergeResult', ['index', 'merged', 'conflicts', 'error'])
+
 
+def __getattr__(name):
+    # The coroutines need Python 3.7, so they live in ``aio``, which
+    # imports this module: load it only when they are asked for.
+    if name in ('merge_async', 'merge_many_async') and not PY2:
+        from inspire_json_merger import aio
 
-def merge(root, head, update, head_source=None, configuration=None):
+        return getattr(aio, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def merge(
+    root,
+    head,
+    update,
+    head_source=None,
+    configuration=None,
+    stats=None,
+    fields=None,
+    reference_fingerprints=None,
+):
     """
     This function instantiate a ``Merger`` object using a configuration in
     according to the ``source`` value of head and update params.
@@ -52,39 +116,328 @@ def merge(root, head, update, head_source=None, configuration=None):
             heuristics are used to derive it from the metadata. This is useful
             if the HEAD came from legacy and the acquisition_source does not
             reflect the state of the record.
+        stats(dict): if given, it is filled with instrumentation about this
+            merge: ``durations`` maps every stage that ran (plus ``total``) to
+            its duration in seconds, ``sizes`` gives the number of
+            ``STATS_SIZE_FIELDS`` elements in ``root``, ``head`` and
+            ``update``, and ``noop_reason`` tells whether the merge was
+            short-circuited. If the merger ran, ``degraded_reason`` tells
+            why the authors were matched by position because their
+            matching exceeded its budget, see ``AuthorComparator``, or is
+            ``None``. If the configuration is not given,
+            ``classification`` contains the ``RecordClassification`` used to
+            choose it.
+        fields(iterable): if given, only these top-level fields are merged,
+            and all the other fields are taken from ``head`` as they are.
+            The configuration is still chosen looking at the whole records.
+        reference_fingerprints(dict): if given, the fingerprints of the
+            references of ``root`` and ``head`` it stores, e.g. from the
+            previous merge of ``head``, are used to tell whether the
+            references were curated, see
+            ``pre_filters.get_stored_reference_fingerprints``. They're
+            ignored if the references changed since they were stored. The
+            dict is then updated with the fingerprints for the next merge of
+            the merged record, which has ``update`` as root, to be stored
+            along with it.
 
     Return
         A tuple containing the resulted merged record in json format and a
         an object containing all generated conflicts.
+
+    Note
+        If ``update`` is equal to ``head`` once the pre-filters ran, it
+        carries no new information, so a copy of the filtered ``head`` is
+        returned without conflicts and without running the merger.
+        ``NOOP_MERGES`` counts these shortcuts. When ``fields`` is given, the
+        records are only compared on them.
+
+        The fields not merged because of ``fields`` are not copied, so they
+        are shared between ``head`` and the merged record. So are the fields
+        not changed by the pre-filters and equal in the three records.
     """
-    if not configuration:
-        configuration = get_configuration(head, update, head_source)
-    conflicts = []
-    root, head, update = filter_records(
-        root, head, update, filters=configuration.pre_filters
-    )
-    merger = Merger(
-        root=root,
-        head=head,
-        update=update,
-        default_dict_merge_op=configuration.default_dict_merge_op,
-        default_list_merge_op=configuration.default_list_merge_op,
-        list_dict_ops=configuration.list_dict_ops,
-        list_merge_ops=configuration.list_merge_ops,
-        comparators=configuration.comparators,
-    )
+    durations = None
+    if stats is not None:
+        durations = stats['durations'] = {}
+        stats['sizes'] = {
+            'root': get_record_sizes(root),
+            'head': get_record_sizes(head),
+            'update': get_record_sizes(update),
+        }
+    full_head, full_update = head, update
+    if fields is not None:
+        fields = frozenset(fields)
+    with _timed(durations, 'total'):
+        if not configuration:
+            with _timed(durations, 'get_configuration'):
+                classification = classify_records(head, update, head_source)
+                configuration = get_configuration(
+                    head, update, classification=classification
+                )
+            if stats is not None:
+                stats['classification'] = classification
+        plan = get_merge_plan(configuration)
+        if fields is not None:
+            filtered_fields = plan.get_filtered_fields(fields)
+            if filtered_fields is not None:
+                root, head, update = (
+                    _select_fields(record, filtered_fields)
+                    for record in (root, head, update)
+                )
+        conflicts = []
+        with _timed(durations, 'filter_records'):
+            root, head, update = plan.filter_records(
+                root, head, update, reference_fingerprints=reference_fingerprints
+            )
+        if fields is not None:
+            root, head, update = (
+                _select_fields(record, fields) for record in (root, head, update)
+            )
+        with _timed(durations, 'get_noop_reason'):
+            noop_reason = get_noop_reason(head, update)
+        if stats is not None:
+            stats['noop_reason'] = noop_reason
+        if noop_reason:
+            NOOP_MERGES[noop_reason] += 1
+            merged = copy.deepcopy(head)
+        else:
+            with _timed(durations, 'split_unchanged_fields'):
+                resolved, root, head, update = split_unchanged_fields(
+                    root, head, update
+                )
+            with _timed(durations, 'merge'):
+                merger = plan.get_merger(root, head, update)
+                try:
+                    merger.merge()
+                except MergeError as e:
+                    conflicts = e.content
+            if stats is not None:
+                stats['degraded_reason'] = plan.get_degraded_reason(merger)
+            with _timed(durations, 'filter_conflicts'):
+                conflicts = plan.filter_conflicts(conflicts)
+            merged = merger.merged_root
+            merged.update(resolved)
+
+            with _timed(durations, 'postprocess_results'):
+                merged, conflicts = postprocess_results(
+                    merged, conflicts, AuthorPositions.from_merger(merger)
+                )
+        if fields is not None:
+            merged = _replace_fields(full_head, merged, fields)
+        _update_reference_fingerprints(reference_fingerprints, full_update, merged)
+        return merged, conflicts
+
+
+def _update_reference_fingerprints(fingerprints, update, merged):
+    """Replace the reference fingerprints by the ones of the next merge.
+
+    The next merge of ``merged`` has ``update`` as root. The fingerprints
+    given are reused for references with the same digest, the other ones
+    are computed once.
+    """
+    if fingerprints is None:
+        return
+    known = {}
+    for key in ('root', 'head'):
+        digest = fingerprints.get(key + '_digest')
+        if digest is not None and fingerprints.get(key) is not None:
+            known[digest] = fingerprints[key]
+
+    for key, record in (('root', update), ('head', merged)):
+        references = record.get('references', [])
+        digest = get_references_digest(references)
+        if digest not in known:
+            known[digest] = get_reference_fingerprints(references)
+        fingerprints[key] = known[digest]
+        fingerprints[key + '_digest'] = digest
+
+
+def _select_fields(record, fields):
+    return {key: value for key, value in record.items() if key in fields}
+
+
+def _replace_fields(record, values, fields):
+    """Return a shallow copy of ``record`` with ``fields`` set from ``values``."""
+    record = {key: value for key, value in record.items() if key not in fields}
+    record.update(values)
+    return record
+
+
+@contextmanager
+def _timed(durations, stage):
+    """Store in ``durations`` how long the block took, if it's not ``None``."""
+    if durations is None:
+        yield
+        return
+    start = default_timer()
+    try:
+        yield
+    finally:
+        durations[stage] = default_timer() - start
+
+
+def get_record_sizes(record):
+    """Count the elements of the ``STATS_SIZE_FIELDS`` lists of a record."""
+    return {field: len(record.get(field, ())) for field in STATS_SIZE_FIELDS}
+
+
+def get_noop_reason(head, update):
+    """Return why merging ``update`` would be a no-op, or ``None``.
+
+    The records are the ones given to the merger, after the pre-filters:
+    these can change ``root`` and ``update`` so that an ``update`` equal to
+    ``root`` still brings changes, so ``root`` isn't compared.
+
+    Dict equality bails out on the first difference and needs no
+    serialization, so this is cheaper than hashing the records.
+    """
+    if update == head:
+        return 'update_equals_head'
+    return None
+
+
+def merge_many(triples, workers=None, chunksize=1, ordered=True):
+    """
+    This function merges many records in parallel using a pool of worker
+    processes, calling ``merge`` on every item.
+
+    Params
+        triples(iterable): tuples of the form ``(root, head, update)`` or
+            ``(root, head, update, head_source)``. It is consumed lazily, so
+            it can be a generator over a dump bigger than memory.
+        workers(int): number of worker processes. If ``None``, the number of
+            CPUs is used.
+        chunksize(int): number of items sent to a worker at once. Bigger
+            chunks lower the inter-process overhead for small records.
+        ordered(bool): if ``True``, results are yielded in input order,
+            otherwise as soon as they are ready.
+
+    Return
+        An iterator of ``MergeResult`` tuples ``(index, merged, conflicts,
+        error)``, where ``index`` is the position of the item in ``triples``.
+        If merging an item raised, ``merged`` and ``conflicts`` are ``None``
+        and ``error`` contains the formatted traceback; the other items are
+        not affected.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    # Bound the number of chunks in flight so that a lazy input is never
+    # read much ahead of what the workers can process.
+    max_pending = 2 * workers
+    chunks = _chunked(enumerate(triples), chunksize)
+    pool = _MergePool(workers)
+    try:
+        if ordered:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((pool.submit(chunk), chunk))
+                if len(pending) >= max_pending:
+                    for result in pool.get_results(*pending.popleft()):
+                        yield result
+            while pending:
+                for result in pool.get_results(*pending.popleft()):
+                    yield result
+        else:
+            pending = {}
+            for chunk in chunks:
+                pending[pool.submit(chunk)] = chunk
+                while len(pending) >= max_pending:
+                    for result in _get_first_completed_results(pool, pending):
+                        yield result
+            while pending:
+                for result in _get_first_completed_results(pool, pending):
+                    yield result
+    finally:
+        pool.shutdown()
+
+
+def _get_first_completed_results(pool, pending):
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        for result in pool.get_results(future, pending.pop(future)):
+            yield result
+
+
+class _MergePool(object):
+    """Process pool merging chunks of triples, which survives dying workers.
+
+    When a worker process dies, e.g. killed for using too much memory, the
+    chunks in flight fail with ``BrokenProcessPool`` and a new pool is started
+    for the following ones.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers)
+        self.futures = set()
+
+    def submit(self, chunk):
+        try:
+            future = self.executor.submit(_merge_chunk, chunk)
+        except BrokenProcessPool:
+            self.executor.shutdown(wait=False)
+            self.executor = ProcessPoolExecutor(self.workers)
+            future = self.executor.submit(_merge_chunk, chunk)
+        self.futures.add(future)
+        return future
+
+    def get_results(self, future, chunk):
+        """Return the results of a chunk, reporting its failure on every item."""
+        self.futures.discard(future)
+        try:
+            return future.result()
+        except Exception:
+            error = traceback.format_exc()
+            return [MergeResult(index, None, None, error) for index, _ in chunk]
+
+    def shutdown(self):
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown()
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def _merge_chunk(chunk):
+    return [_merge_item(index, triple) for index, triple in chunk]
+
 
+def _merge_item(index, triple):
     try:
-        merger.merge()
-    except MergeError as e:
-        conflicts = e.content
-    conflicts = filter_conflicts(conflicts, configuration.conflict_filters)
-    merged = merger.merged_root
+        merged, conflicts = merge(*triple)
+    except Exception:
+        return MergeResult(index, None, None, traceback.format_exc())
+    return MergeResult(index, merged, conflicts, None)
 
-    return postprocess_results(merged, conflicts)
 
+def classify_records(head, update, head_source=None):
+    """
+    This function extracts from head and update all the signals used to
+    choose the merge configuration, reading every field it needs once.
+
+    Params:
+        head(dict): the HEAD record
+        update(dict): the UPDATE record
+        head_source(string): the source of the HEAD record. If ``None``, it's
+            derived from the metadata of ``head``.
 
-def get_configuration(head, update, head_source=None):
+    Returns:
+        RecordClassification: the signals, which can be passed again to
+        ``get_configuration`` or reported, e.g. in metrics.
+    """
+    return RecordClassification(
+        head_source=head_source or get_head_source(head),
+        update_source=get_acquisition_source(update),
+        manual_merge=is_manual_merge(head, update),
+        erratum=is_erratum(update),
+    )
+
+
+def get_configuration(head, update, head_source=None, classification=None):
     """
     This function return the right configuration for the inspire_merge
     function in according to the given sources. Both parameters can not be None.
@@ -93,56 +446,57 @@ def get_configuration(head, update, head_source=None):
         head(dict): the HEAD record
         update(dict): the UPDATE record
         head_source(string): the source of the HEAD record
+        classification(RecordClassification): the result of
+            ``classify_records`` for these records, if already computed.
 
     Returns:
         MergerConfigurationOperations: an object containing
         the rules needed to merge HEAD and UPDATE
     """
-    head_source = head_source or get_head_source(head)
-    update_source = get_acquisition_source(update)
+    if classification is None:
+        classification = classify_records(head, update, head_source)
 
-    if is_manual_merge(head, update):
+    if classification.manual_merge:
         return ManualMergeOperations
 
-    if is_erratum(update):
+    if classification.erratum:
         return ErratumOnPublisherOperations
 
-    if head_source == 'arxiv':
-        if update_source == 'arxiv':
+    if classification.head_source == 'arxiv':
+        if classification.update_source == 'arxiv':
             return ArxivOnArxivOperations
         else:
             return PublisherOnArxivOperations
     else:
-        if update_source == 'arxiv':
+        if classification.update_source == 'arxiv':
             return ArxivOnPublisherOperations
         else:
             return PublisherOnPublisherOperations
 
 
 def get_head_source(json_obj):
-    def no_freetext_in_publication_info(obj):
-        return 'publication_info' in obj and any(
-            'pubinfo_freetext' not in pubinfo for pubinfo in obj.get('publication_info')
-        )
-
-    def no_arxiv_in_dois(obj):
-        return 'dois' in obj and any(
-            source.lower() != 'arxiv'
-            for source in force_list(get_value(obj, 'dois.source'))
-        )
-
-    if no_freetext_in_publication_info(json_obj) or no_arxiv_in_dois(json_obj):
+    publication_info = json_obj.get('publication_info')
+    if publication_info is not None and any(
+        'pubinfo_freetext' not in pubinfo for pubinfo in publication_info
+    ):
         return 'publisher'
 
-    elif 'arxiv_eprints' in json_obj:
+    dois = json_obj.get('dois')
+    if dois is not None and any(
+        doi['source'].lower() != 'arxiv'
+        for doi in force_list(dois)
+        if doi.get('source') is not None
+    ):
+        return 'publisher'
+
+    if 'arxiv_eprints' in json_obj:
         return 'arxiv'
 
-    else:
-        return 'publisher'
+    return 'publisher'
 
 
 def get_acquisition_source(json_obj):
-    source = get_value(json_obj, 'acquisition_source.source')
+    source = (json_obj.get('acquisition_source') or {}).get('source')
     return source.lower() if source else None
 
 
@@ -155,26 +509,15 @@ def is_manual_merge(head, update):
 
 
 def is_erratum(update):
-    erratum_keywords = {
-        "erratum",
-        "corrigendum",
-        "publisher's note",
-        "publisher correction",
-        "author correction"
-    }
-    journal_titles_list = get_value(update, "titles.title", [])
-    journal_titles_string = " ".join(journal_titles_list).lower()
-    title_contains_erratum_keyword = any(
-        [keyword in journal_titles_string for keyword in erratum_keywords]
-    )
-    title_starts_with_correction_to = any(
-        journal_title.lower().startswith('correction to:')
-        for journal_title in journal_titles_list
-    )
-    erratum_in_dois_material = 'erratum' in get_value(update, "dois.material", [])
-    if (
-        title_contains_erratum_keyword
-        or title_starts_with_correction_to
-        or erratum_in_dois_material
-    ):
+    titles = [
+        title['title']
+        for title in force_list(update.get('titles'))
+        if 'title' in title
+    ]
+    if _ERRATUM_KEYWORDS_RE.search(' '.join(titles).lower()):
         return True
+    if any(_CORRECTION_TO_RE.match(title) for title in titles):
+        return True
+    return any(
+        doi.get('material') == 'erratum' for doi in force_list(update.get('dois'))
+    )
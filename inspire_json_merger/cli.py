@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Command line tool merging streams of JSONL records."""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import sys
+
+from inspire_json_merger.api import merge_many
+
+
+def main(argv=None):
+    """Merge the JSONL triples read from a file or stdin.
+
+    Every input line is either an object with the ``root``, ``head``,
+    ``update`` and optionally ``head_source`` keys, or an array with the
+    same items in this order. For every line an output line is written
+    containing its ``line`` number and either the ``merged`` record and its
+    ``conflicts``, or the ``error`` that made the merge fail.
+
+    Return:
+        int: the exit status, ``1`` if any line could not be merged.
+    """
+    parser = argparse.ArgumentParser(
+        prog='inspire-json-merger',
+        description='Merge JSONL (root, head, update) triples.',
+    )
+    parser.add_argument(
+        'input',
+        nargs='?',
+        type=argparse.FileType('r'),
+        default=sys.stdin,
+        help='JSONL file to read the triples from (default: stdin)',
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        type=argparse.FileType('w'),
+        default=sys.stdout,
+        help='JSONL file to write the results to (default: stdout)',
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=None,
+        help='number of worker processes (default: number of CPUs)',
+    )
+    parser.add_argument(
+        '-c',
+        '--chunksize',
+        type=int,
+        default=1,
+        help='number of triples sent to a worker at once (default: 1)',
+    )
+    parser.add_argument(
+        '--unordered',
+        action='store_true',
+        help='write results as soon as they are ready instead of input order',
+    )
+    args = parser.parse_args(argv)
+
+    reader = _TripleReader(args.input, sys.stderr)
+    results = merge_many(
+        reader,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        ordered=not args.unordered,
+    )
+    failed = False
+    for result in results:
+        output = {'line': reader.line_numbers.pop(result.index)}
+        if result.error is None:
+            output['merged'] = result.merged
+            output['conflicts'] = result.conflicts
+        else:
+            output['error'] = result.error
+            failed = True
+        args.output.write(json.dumps(output) + '\n')
+    args.output.flush()
+
+    return 1 if failed or reader.invalid_lines else 0
+
+
+class _TripleReader(object):
+    """Iterable parsing triples out of JSONL lines.
+
+    Lines that can't be parsed are reported to ``errors`` and skipped. The
+    line number of every triple yielded is kept in ``line_numbers`` by triple
+    index until the caller pops it, so memory stays bounded by the number of
+    triples in flight.
+    """
+
+    def __init__(self, lines, errors):
+        self.lines = lines
+        self.errors = errors
+        self.line_numbers = {}
+        self.invalid_lines = 0
+
+    def __iter__(self):
+        index = 0
+        for line_number, line in enumerate(self.lines, 1):
+            if not line.strip():
+                continue
+            try:
+                triple = _parse_triple(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                self.invalid_lines += 1
+                self.errors.write('line %d: invalid triple: %s\n' % (line_number, e))
+                continue
+            self.line_numbers[index] = line_number
+            index += 1
+            yield triple
+
+
+def _parse_triple(obj):
+    if isinstance(obj, dict):
+        return obj['root'], obj['head'], obj['update'], obj.get('head_source')
+    if isinstance(obj, list) and len(obj) in (3, 4):
+        return tuple(obj)
+    raise TypeError('expected an object or an array of 3 or 4 items')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
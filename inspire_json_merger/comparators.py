@@ -22,6 +22,10 @@
 
 from __future__ import absolute_import, division, print_function
 
+import weakref
+from collections import defaultdict, namedtuple
+
+import six
 from json_merger.comparator import PrimaryKeyComparator
 from json_merger.contrib.inspirehep.author_util import (
     AuthorNameDistanceCalculator,
@@ -31,23 +35,67 @@ from json_merger.contrib.inspirehep.author_util import (
 )
 from json_merger.contrib.inspirehep.comparators import DistanceFunctionComparator
 
-from inspire_json_merger.utils import scan_author_string_for_phrases
+from inspire_json_merger.matching import (
+    MAX_DISTANCE_PAIRS,
+    MAX_MUNKRES_SIZE,
+    PARALLEL_MIN_AUTHORS,
+    AuthorKeys,
+    match_authors,
+)
+from inspire_json_merger.utils import LRUCache, scan_author_string_for_phrases
+
+# Number of names whose tokens are kept by ``author_tokenize``, it can be
+# changed with ``author_tokenize.cache.resize``.
+AUTHOR_TOKENIZE_CACHE_SIZE = 2**14
 
 
 def author_tokenize(name):
-    """This is how the name should be tokenized for the matcher."""
+    """This is how the name should be tokenized for the matcher.
+
+    The same names are tokenized many times during a merge, and again in the
+    following merges, so the tokens are kept in ``author_tokenize.cache``, an
+    ``LRUCache`` shared by all the merges of the process. They are returned
+    as an immutable ``NameTokens``, as they are shared between the callers.
+    """
+    return author_tokenize.cache.get(name, _author_tokenize)
+
+
+author_tokenize.cache = LRUCache(AUTHOR_TOKENIZE_CACHE_SIZE)
+
+
+class NameTokens(namedtuple('NameTokens', ['lastnames', 'nonlastnames'])):
+    """The tuples of tokens of a name, also readable as ``tokens['lastnames']``."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, six.string_types):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return super(NameTokens, self).__getitem__(key)
+
+
+def _author_tokenize(name):
     phrases = scan_author_string_for_phrases(name)
-    res = {'lastnames': [], 'nonlastnames': []}
-    for key, tokens in phrases.items():
-        lst = res.get(key)
-        if lst is None:
-            continue
-        for token in tokens:
-            if len(token) == 1:
-                lst.append(NameInitial(token))
-            else:
-                lst.append(NameToken(token))
-    return res
+    return NameTokens(
+        tuple(_get_name_token(token) for token in phrases['lastnames']),
+        tuple(_get_name_token(token) for token in phrases['nonlastnames']),
+    )
+
+
+# The tokens in use, shared between all the names containing them.
+_NAME_TOKENS = weakref.WeakValueDictionary()
+
+
+def _get_name_token(token):
+    is_initial = len(token) == 1
+    key = (is_initial, token.lower())
+    name_token = _NAME_TOKENS.get(key)
+    if name_token is None:
+        name_token = NameInitial(token) if is_initial else NameToken(token)
+        _NAME_TOKENS[key] = name_token
+    return name_token
 
 
 class IDNormalizer(object):
@@ -65,12 +113,45 @@ class IDNormalizer(object):
 
 
 class AuthorComparator(DistanceFunctionComparator):
+    """Match authors by name, using their identifiers as hints.
+
+    The matches are the same as those of a ``DistanceFunctionComparator``
+    normalizing with an ``IDNormalizer`` for each of the ``id_types``, then
+    with the ``norm_functions``. The identifiers of every author are read
+    once, and the distance is only computed between authors which can be
+    close enough, see ``matching.match_authors``. The matches can only
+    differ when more than ``max_munkres_size`` authors can only be matched
+    together, which are then matched greedily.
+
+    The keys of the authors (identifiers and normalized names) are computed
+    by every comparator, unless ``author_keys`` is set on a subclass made by
+    ``with_author_keys``, to share them between the comparators of a merge.
+    Either way, they're cached by the ``full_name`` and ``ids`` of the
+    authors, see ``matching.AuthorKeys``, so the ``norm_functions`` must only
+    read these two fields: authors differing elsewhere get the same keys.
+
+    Setting ``executor`` to a ``concurrent.futures.Executor`` runs the
+    matching by distance of lists with at least ``parallel_min_authors``
+    authors in chunks with it, giving the same matches.
+
+    Matching by distance is given a budget of ``max_distance_pairs`` pairs
+    of authors and ``timeout`` seconds, after which the authors left are
+    matched by position. ``degraded_reason`` tells whether that happened,
+    and the subclasses made by ``with_author_keys`` also record it in their
+    ``matching_stats``, shared by the comparators of a merge.
+    """
+
     threshold = 0.12
     distance_function = AuthorNameDistanceCalculator(author_tokenize)
+    id_types = ['ORCID', 'INSPIRE ID', 'INSPIRE BAI']
+    max_munkres_size = MAX_MUNKRES_SIZE
+    author_keys = None
+    executor = None
+    parallel_min_authors = PARALLEL_MIN_AUTHORS
+    max_distance_pairs = MAX_DISTANCE_PAIRS
+    timeout = None
+    matching_stats = None
     norm_functions = [
-        IDNormalizer('ORCID'),
-        IDNormalizer('INSPIRE ID'),
-        IDNormalizer('INSPIRE BAI'),
         AuthorNameNormalizer(author_tokenize),
         AuthorNameNormalizer(author_tokenize, asciify=True),
         AuthorNameNormalizer(author_tokenize, first_names_number=1),
@@ -86,6 +167,72 @@ class AuthorComparator(DistanceFunctionComparator):
         ),
     ]
 
+    def process_lists(self):
+        stats = {}
+        self.matches = set(
+            match_authors(
+                self.l1,
+                self.l2,
+                self.threshold,
+                self.distance_function,
+                self.norm_functions,
+                self.id_types,
+                self.max_munkres_size,
+                self.author_keys,
+                self.executor,
+                self.parallel_min_authors,
+                self.max_distance_pairs,
+                self.timeout,
+                stats,
+            )
+        )
+        self._matches_index = None
+        self.degraded_reason = stats.get('degraded_reason')
+        if self.degraded_reason and self.matching_stats is not None:
+            self.matching_stats['degraded_reason'] = self.degraded_reason
+
+    @classmethod
+    def with_author_keys(cls, *author_lists):
+        """Make a subclass looking up the keys of the given authors.
+
+        Args:
+            author_lists: the lists of authors whose keys are computed.
+
+        Returns:
+            type: a subclass of this comparator, with an ``AuthorKeys``
+            containing the keys of all the authors as ``author_keys``, and
+            its own ``matching_stats``.
+        """
+        author_keys = AuthorKeys(cls.id_types, cls.norm_functions)
+        for authors in author_lists:
+            author_keys.add(authors)
+        return type(
+            cls.__name__,
+            (cls,),
+            {'author_keys': author_keys, 'matching_stats': {}},
+        )
+
+    def get_matches(self, src, src_idx):
+        """Get the elements of the other list matching the ``src_idx``'th.
+
+        Same as ``BaseComparator.get_matches``, but looked up in an index of
+        the matches instead of checking every element of the other list.
+        """
+        if src not in ('l1', 'l2'):
+            raise ValueError('Must have one of "l1" or "l2" as src')
+        if self._matches_index is None:
+            self._matches_index = {'l1': defaultdict(list), 'l2': defaultdict(list)}
+            for l1_idx, l2_idx in sorted(self.matches):
+                self._matches_index['l1'][l1_idx].append(l2_idx)
+                self._matches_index['l2'][l2_idx].append(l1_idx)
+            for matches in self._matches_index['l2'].values():
+                matches.sort()
+        target_list = self.l2 if src == 'l1' else self.l1
+        return [
+            (trg_idx, target_list[trg_idx])
+            for trg_idx in self._matches_index[src].get(src_idx, ())
+        ]
+
 
 def get_pk_comparator(primary_key_fields, normalization_functions=None):
     class Ret(PrimaryKeyComparator):
@@ -35,7 +35,6 @@ from inspire_json_merger.pre_filters import (
     remove_references_from_update,
     remove_root,
     remove_root_preprint_date,
-    update_authors_with_ordering_info,
     update_material,
 )
 
@@ -60,7 +59,6 @@ class ArxivOnArxivOperations(MergerConfigurationOperations):
         filter_documents_same_source,
         filter_figures_same_source,
         filter_curated_references,
-        update_authors_with_ordering_info,
         remove_root_preprint_date,
     ]
     conflict_filters = [
@@ -128,7 +126,6 @@ class ArxivOnPublisherOperations(MergerConfigurationOperations):
         filter_documents_same_source,
         filter_figures_same_source,
         filter_publisher_references,
-        update_authors_with_ordering_info,
         clean_root_for_acquisition_source,
         remove_root_preprint_date,
     ]
@@ -182,7 +179,6 @@ class ManualMergeOperations(MergerConfigurationOperations):
     default_list_merge_op = U.KEEP_UPDATE_AND_HEAD_ENTITIES_HEAD_FIRST
     comparators = COMPARATORS
     pre_filters = [
-        update_authors_with_ordering_info,
         remove_references_from_update,
     ]  # don't delete files with the same source
     conflict_filters = [
@@ -208,7 +204,6 @@ class PublisherOnArxivOperations(MergerConfigurationOperations):
         filter_documents_same_source,
         filter_figures_same_source,
         filter_curated_references,
-        update_authors_with_ordering_info,
         clean_root_for_acquisition_source,
     ]
     conflict_filters = [
@@ -258,7 +253,6 @@ class PublisherOnPublisherOperations(MergerConfigurationOperations):
         filter_documents_same_source,
         filter_figures_same_source,
         filter_curated_references,
-        update_authors_with_ordering_info,
         clean_root_for_acquisition_source,
     ]
     conflict_filters = [
@@ -323,7 +317,7 @@ class GrobidOnArxivAuthorsOperations(MergerConfigurationOperations):
 
 class ErratumOnPublisherOperations(MergerConfigurationOperations):
     comparators = COMPARATORS
-    pre_filters = [update_material, update_authors_with_ordering_info, remove_root]
+    pre_filters = [update_material, remove_root]
     default_list_merge_op = U.KEEP_UPDATE_AND_HEAD_ENTITIES_HEAD_FIRST
     default_dict_merge_op = D.FALLBACK_KEEP_HEAD
     list_merge_ops = {
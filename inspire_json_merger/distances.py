@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Distances between many pairs of authors at once.
+
+``AuthorNameDistanceCalculator`` tokenizes both names, computes the distance
+between every pair of tokens and matches the tokens with the Munkres
+algorithm, for every pair of authors. When NumPy is installed and there are
+enough pairs, the names are tokenized once and all the pairs are computed
+in batches instead, giving the same distances.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from collections import defaultdict
+from itertools import permutations
+
+from json_merger.contrib.inspirehep.author_util import (
+    AuthorNameDistanceCalculator,
+    NameInitial,
+    _asciify,
+    _decode_if_not_unicode,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Number of pairs from which the distances are computed with NumPy. Below
+# it, building the arrays costs more than it saves.
+NUMPY_MIN_PAIRS = 500
+
+# Maximum number of ways to match the tokens of two names, the names with
+# more tokens than that are left to the distance function.
+MAX_TOKEN_ASSIGNMENTS = 720
+
+# Matchings of the tokens whose costs are closer than this are considered
+# tied, as the Munkres algorithm may pick any of them.
+_TIE_TOLERANCE = 1e-9
+
+
+def get_distances(authors1, authors2, pairs, distance_function, min_pairs=None):
+    """Compute the distance between pairs of authors.
+
+    Args:
+        authors1 (list): the first list of authors.
+        authors2 (list): the second list of authors.
+        pairs (list): the ``(index1, index2)`` pairs of authors.
+        distance_function (callable): the distance between two authors.
+        min_pairs (int): the number of pairs from which NumPy is used, if
+            installed and the distance function is an
+            ``AuthorNameDistanceCalculator``. Defaults to
+            ``NUMPY_MIN_PAIRS``.
+
+    Returns:
+        list: the distance of every pair, as returned by ``distance_function``.
+    """
+    if min_pairs is None:
+        min_pairs = NUMPY_MIN_PAIRS
+    if (
+        numpy is None
+        or len(pairs) < min_pairs
+        or not isinstance(distance_function, AuthorNameDistanceCalculator)
+    ):
+        return [distance_function(authors1[i1], authors2[i2]) for i1, i2 in pairs]
+    return _get_batch_distances(authors1, authors2, pairs, distance_function)
+
+
+def _get_batch_distances(authors1, authors2, pairs, distance_function):
+    """Compute the distances of ``get_distances`` with NumPy.
+
+    The pairs are grouped by number of tokens of both names, and all the
+    ways to match the tokens of a group are tried at once. When several of
+    them have the lowest cost but give different distances, the pair is left
+    to the distance function, as the choice is up to the Munkres algorithm.
+    """
+    vocabulary = _Vocabulary()
+    tokens1 = {}
+    tokens2 = {}
+    for i1, i2 in pairs:
+        if i1 not in tokens1:
+            tokens1[i1] = vocabulary.add_name(authors1[i1], distance_function)
+        if i2 not in tokens2:
+            tokens2[i2] = vocabulary.add_name(authors2[i2], distance_function)
+
+    distances = [None] * len(pairs)
+    unbatched = []
+    groups = defaultdict(list)
+    for index, (i1, i2) in enumerate(pairs):
+        name1, name2 = tokens1[i1], tokens2[i2]
+        if name1 is None or name2 is None:
+            distances[index] = 1.0
+        elif (
+            not name1
+            or not name2
+            or _count_assignments(len(name1), len(name2)) > MAX_TOKEN_ASSIGNMENTS
+        ):
+            unbatched.append(index)
+        else:
+            groups[len(name1), len(name2)].append(index)
+
+    if groups:
+        token_distances = _TokenDistances(vocabulary, distance_function)
+    for indices in groups.values():
+        group_tokens1 = numpy.array(
+            [tokens1[pairs[index][0]] for index in indices], dtype=numpy.intp
+        )
+        group_tokens2 = numpy.array(
+            [tokens2[pairs[index][1]] for index in indices], dtype=numpy.intp
+        )
+        group_distances, tied = _get_group_distances(
+            group_tokens1, group_tokens2, token_distances
+        )
+        group_distances, tied = group_distances.tolist(), tied.tolist()
+        for position, index in enumerate(indices):
+            if tied[position]:
+                unbatched.append(index)
+            else:
+                distances[index] = group_distances[position]
+
+    for index in unbatched:
+        i1, i2 = pairs[index]
+        distances[index] = distance_function(authors1[i1], authors2[i2])
+    return distances
+
+
+def _count_assignments(size1, size2):
+    """Number of ways to match all the tokens of the shortest name."""
+    count = 1
+    for size in range(max(size1, size2), abs(size1 - size2), -1):
+        count *= size
+    return count
+
+
+def _get_group_distances(tokens1, tokens2, token_distances):
+    """Distances between names with the same numbers of tokens.
+
+    Args:
+        tokens1 (numpy.ndarray): the token ids of the first names, one row
+            per pair.
+        tokens2 (numpy.ndarray): the token ids of the second names.
+        token_distances (_TokenDistances): the distances between tokens.
+
+    Returns:
+        tuple: the distance of every pair, and whether the lowest cost
+        matchings of its tokens give different distances.
+    """
+    size1, size2 = tokens1.shape[1], tokens2.shape[1]
+    matrices = token_distances.get(tokens1[:, :, None], tokens2[:, None, :])
+
+    # The Munkres algorithm returns the matched tokens by row, and their costs
+    # are summed in that order.
+    if size1 <= size2:
+        columns = numpy.array(list(permutations(range(size2), size1)))
+        rows = numpy.broadcast_to(numpy.arange(size1), columns.shape)
+    else:
+        matched_rows = numpy.array(list(permutations(range(size1), size2)))
+        columns = numpy.argsort(matched_rows, axis=1)
+        rows = matched_rows[numpy.arange(len(columns))[:, None], columns]
+
+    costs = matrices[:, rows, columns]
+    total_costs = numpy.zeros(costs.shape[:2])
+    for position in range(costs.shape[2]):
+        total_costs = total_costs + costs[:, :, position]
+
+    initials = token_distances.initials
+    only_initials = numpy.all(
+        initials[tokens1[:, rows]] & initials[tokens2[:, columns]], axis=2
+    )
+    distances = numpy.where(
+        only_initials, 1.0, total_costs / float(max(min(size1, size2), 1))
+    )
+
+    lowest = total_costs <= total_costs.min(axis=1)[:, None] + _TIE_TOLERANCE
+    smallest = numpy.where(lowest, distances, numpy.inf).min(axis=1)
+    largest = numpy.where(lowest, distances, -numpy.inf).max(axis=1)
+    return smallest, smallest != largest
+
+
+class _Vocabulary(object):
+    """The distinct tokens of the names, numbered in order of appearance."""
+
+    def __init__(self):
+        self.ids = {}
+        self.tokens = []
+        self._initials = []
+
+    @property
+    def initials(self):
+        return numpy.array(self._initials, dtype=bool)
+
+    def add_name(self, author, distance_function):
+        """Get the token ids of a name, like ``AuthorNameDistanceCalculator``.
+
+        Returns:
+            tuple: the ids of the tokens, ``None`` if the author has no name.
+        """
+        if distance_function.name_field not in author:
+            return None
+        name = _asciify(_decode_if_not_unicode(author[distance_function.name_field]))
+        tokens = distance_function.tokenize_function(name)
+        return tuple(
+            self._add_token(token)
+            for token in tuple(tokens['lastnames']) + tuple(tokens['nonlastnames'])
+        )
+
+    def _add_token(self, token):
+        key = (token.token, isinstance(token, NameInitial))
+        token_id = self.ids.get(key)
+        if token_id is None:
+            token_id = self.ids[key] = len(self.tokens)
+            self.tokens.append(token.token)
+            self._initials.append(key[1])
+        return token_id
+
+
+class _TokenDistances(object):
+    """Distances between the tokens of a vocabulary, computed on demand."""
+
+    def __init__(self, vocabulary, distance_function):
+        self.penalization = distance_function.match_on_initial_penalization
+        self.size = len(vocabulary.tokens)
+        self.lengths = numpy.array(
+            [len(token) for token in vocabulary.tokens], dtype=numpy.intp
+        )
+        self.characters = numpy.zeros(
+            (self.size, max(self.lengths.max(), 1)), dtype=numpy.int32
+        )
+        for token_id, token in enumerate(vocabulary.tokens):
+            self.characters[token_id, : len(token)] = [ord(char) for char in token]
+        self.initials = vocabulary.initials
+
+    def get(self, ids1, ids2):
+        """Distances between the tokens of two broadcastable arrays of ids."""
+        ids1, ids2 = numpy.broadcast_arrays(ids1, ids2)
+        keys, inverse = numpy.unique(
+            ids1 * self.size + ids2, return_inverse=True
+        )
+        distances = self._compute(keys // self.size, keys % self.size)
+        return distances[inverse].reshape(ids1.shape)
+
+    def _compute(self, ids1, ids2):
+        """Same as ``author_util.token_distance``, for arrays of token ids."""
+        distances = numpy.empty(len(ids1))
+        with_initial = self.initials[ids1] | self.initials[ids2]
+
+        initial1, initial2 = ids1[with_initial], ids2[with_initial]
+        equal = (self.lengths[initial1] == self.lengths[initial2]) & numpy.all(
+            self.characters[initial1] == self.characters[initial2], axis=1
+        )
+        # ``t1 == t2`` compares the start of the other token to the initial,
+        # and to the second one if both are initials.
+        is_first_initial = self.initials[initial1]
+        prefix = numpy.where(
+            is_first_initial,
+            self._starts_with(initial2, initial1),
+            self._starts_with(initial1, initial2),
+        )
+        distances[with_initial] = numpy.where(
+            equal, 0.0, numpy.where(prefix, self.penalization, 1.0)
+        )
+
+        full1, full2 = ids1[~with_initial], ids2[~with_initial]
+        if not len(full1):
+            return distances
+        lengths1, lengths2 = self.lengths[full1], self.lengths[full2]
+        distances[~with_initial] = self._edit_distances(full1, full2) / numpy.maximum(
+            numpy.maximum(lengths1, lengths2), 1
+        )
+        return distances
+
+    def _starts_with(self, ids, prefix_ids):
+        """Whether each token starts with the corresponding prefix."""
+        prefix_lengths = self.lengths[prefix_ids]
+        positions = numpy.arange(self.characters.shape[1])
+        return (self.lengths[ids] >= prefix_lengths) & numpy.all(
+            (self.characters[ids] == self.characters[prefix_ids])
+            | (positions >= prefix_lengths[:, None]),
+            axis=1,
+        )
+
+    def _edit_distances(self, ids1, ids2):
+        """Levenshtein distances, filling the dynamic programming table of
+        all the pairs row by row."""
+        lengths1, lengths2 = self.lengths[ids1], self.lengths[ids2]
+        width = int(max(lengths1.max(), lengths2.max()))
+        characters1 = self.characters[ids1, :width]
+        characters2 = self.characters[ids2, :width]
+        pairs = numpy.arange(len(ids1))
+
+        distances = lengths2.copy()
+        previous = numpy.tile(numpy.arange(width + 1), (len(ids1), 1))
+        for row in range(1, width + 1):
+            replaced = previous[:, :-1] + (
+                characters1[:, row - 1, None] != characters2
+            )
+            kept = numpy.minimum(previous[:, 1:] + 1, replaced)
+            current = numpy.empty_like(previous)
+            current[:, 0] = row
+            for column in range(1, width + 1):
+                current[:, column] = numpy.minimum(
+                    kept[:, column - 1], current[:, column - 1] + 1
+                )
+            finished = lengths1 == row
+            distances[finished] = current[pairs[finished], lengths2[finished]]
+            previous = current
+        return distances
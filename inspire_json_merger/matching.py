@@ -0,0 +1,647 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Matching of author lists, scaling to big collaborations.
+
+``match_authors`` gives the same matches as ``distance_function_match`` of
+``json_merger``, which computes the distance between every pair of authors
+left unmatched by the normalization functions. Here the distance is only
+computed for the pairs sharing a blocking key, which are chosen so that no
+pair closer than the threshold is skipped.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from collections import defaultdict
+from timeit import default_timer
+
+from json_merger.contrib.inspirehep.author_util import (
+    NameInitial,
+    _asciify,
+    _decode_if_not_unicode,
+)
+from json_merger.contrib.inspirehep.match import (
+    BipartiteConnectedComponents,
+    _match_by_norm_func,
+    _match_munkres,
+)
+
+from inspire_json_merger.distances import get_distances
+
+# Size of the biggest group of authors matched with the Munkres algorithm,
+# whose time is cubic in it. Bigger ones are matched greedily.
+MAX_MUNKRES_SIZE = 150
+
+# Number of authors from which the matching is run by the executor given to
+# ``match_authors``, below it the overhead isn't worth it.
+PARALLEL_MIN_AUTHORS = 1000
+
+# Number of pairs of authors of the chunks run by the executor.
+PARALLEL_CHUNK_PAIRS = 5000
+
+# Maximum number of pairs of authors whose distance is computed by
+# ``match_authors``, each taking a few hundred bytes. Beyond it, the authors
+# are matched by position instead.
+MAX_DISTANCE_PAIRS = 2000000
+
+
+def match_authors(
+    l1,
+    l2,
+    threshold,
+    distance_function,
+    norm_functions=(),
+    id_types=(),
+    max_munkres_size=MAX_MUNKRES_SIZE,
+    author_keys=None,
+    executor=None,
+    parallel_min_authors=PARALLEL_MIN_AUTHORS,
+    max_pairs=MAX_DISTANCE_PAIRS,
+    timeout=None,
+    stats=None,
+):
+    """Match two lists of authors.
+
+    The authors are first matched on their identifiers, then on their names
+    normalized by every normalization function, and the ones left are
+    matched by distance.
+
+    Matching by distance needs memory and time growing with the number of
+    pairs of authors which can be close. If there are more than
+    ``max_pairs`` of them, or if the matching takes more than ``timeout``,
+    the matching is degraded: the authors left are matched by position,
+    see ``_match_by_position``, keeping the matches already found.
+
+    Args:
+        l1 (list): the first list of authors.
+        l2 (list): the second list of authors.
+        threshold (float): the maximum distance between matching authors.
+        distance_function (AuthorNameDistanceCalculator): the distance
+            between two authors.
+        norm_functions (list): callables normalizing an author, tried in
+            order to match the authors having the same normalized value.
+        id_types (list): schemas of the ``ids`` of the authors, tried in order
+            before the normalization functions, as if each was normalizing
+            an author to its first identifier of that schema.
+        max_munkres_size (int): the groups of authors which can only be
+            matched together are matched with the Munkres algorithm if they
+            have at most this many authors from each list, otherwise greedily
+            by increasing distance.
+        author_keys (AuthorKeys): the keys of the authors for these
+            ``id_types`` and ``norm_functions``, if they were computed before.
+        executor (concurrent.futures.Executor): if given, the matching by
+            distance is split in chunks run by it, when one of the lists has
+            at least ``parallel_min_authors`` authors. The distance function
+            must be picklable to use a ``ProcessPoolExecutor``.
+        parallel_min_authors (int): see ``executor``.
+        max_pairs (int): the maximum number of pairs of authors whose
+            distance is computed, ``None`` for no limit.
+        timeout (float): the time in seconds after which the matching is
+            degraded, ``None`` for no limit. It's checked between the steps
+            of the matching, so it can be exceeded by a bit.
+        stats (dict): if given and the matching is degraded,
+            ``degraded_reason`` is set to ``'max_pairs'`` or ``'timeout'``
+            in it.
+
+    Returns:
+        list: the pairs ``(l1_index, l2_index)`` of matching authors.
+    """
+    budget = _Budget(max_pairs, timeout)
+    if author_keys is None:
+        author_keys = AuthorKeys(id_types, norm_functions)
+    if max(len(l1), len(l2)) < parallel_min_authors:
+        executor = None
+    common = []
+    # Keep the keys of every author next to its index.
+    l1 = [((index, author_keys.get(author)), author) for index, author in enumerate(l1)]
+    l2 = [((index, author_keys.get(author)), author) for index, author in enumerate(l2)]
+
+    def distance(element1, element2):
+        return distance_function(element1[1], element2[1])
+
+    getters = [_IDGetter(id_type) for id_type in id_types] + [
+        _NameGetter(position) for position in range(len(norm_functions))
+    ]
+    try:
+        for position, getter in enumerate(getters):
+            if position >= len(id_types):
+                budget.check_time()
+            new_common, l1, l2 = _match_by_norm_func(
+                l1, l2, getter, distance, threshold
+            )
+            common.extend((c1[0][0], c2[0][0]) for c1, c2 in new_common)
+        residue = _match_residue(
+            _without_keys(l1),
+            _without_keys(l2),
+            threshold,
+            distance_function,
+            max_munkres_size,
+            executor,
+            budget,
+        )
+    except MatchingBudgetExceeded as error:
+        if stats is not None:
+            stats['degraded_reason'] = error.reason
+        residue = _match_by_position(
+            _without_keys(l1), _without_keys(l2), threshold, distance_function
+        )
+    common.extend((c1[0], c2[0]) for c1, c2 in residue)
+    return common
+
+
+def _without_keys(elements):
+    return [(index, author) for (index, _), author in elements]
+
+
+class MatchingBudgetExceeded(Exception):
+    """Raised when matching authors by distance exceeds its budget."""
+
+    def __init__(self, reason):
+        super(MatchingBudgetExceeded, self).__init__(reason)
+        self.reason = reason
+
+
+class _Budget(object):
+    """The number of pairs and the time that matching by distance can use."""
+
+    def __init__(self, max_pairs=None, timeout=None):
+        self.max_pairs = max_pairs
+        self.deadline = None if timeout is None else default_timer() + timeout
+
+    def check_pairs(self, count):
+        if self.max_pairs is not None and count > self.max_pairs:
+            raise MatchingBudgetExceeded('max_pairs')
+
+    def check_time(self):
+        if self.deadline is not None and default_timer() > self.deadline:
+            raise MatchingBudgetExceeded('timeout')
+
+
+def _match_by_position(l1, l2, threshold, distance_function):
+    """Match the ``(index, author)`` pairs left, in the order of the lists.
+
+    The n-th author left in ``l1`` matches the n-th one left in ``l2`` if
+    their distance is at most the threshold. It's linear in the number of
+    authors, but it misses the authors moved or added in the middle of a
+    list.
+    """
+    return [
+        (l1[position], l2[position])
+        for position in range(min(len(l1), len(l2)))
+        if distance_function(l1[position][1], l2[position][1]) <= threshold
+    ]
+
+
+class AuthorKeys(object):
+    """Side table of the identifiers and normalized names of authors.
+
+    The keys of an author only depend on its name and identifiers, which are
+    used to look them up: the merger works on copies of the records, so an
+    author can't be found by its position or identity. This way the keys of
+    the authors of the three records can be computed once, before the
+    comparators need them. The ``norm_functions`` must then only read the
+    ``full_name`` and ``ids`` of the authors.
+    """
+
+    def __init__(self, id_types, norm_functions):
+        self.id_types = tuple(id_types)
+        self.norm_functions = tuple(norm_functions)
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, authors):
+        """Compute the keys of all the authors of a list."""
+        for author in authors:
+            self.get(author)
+
+    def get(self, author):
+        """Get the keys of an author.
+
+        Returns:
+            tuple: ``(ids, names)``, the first identifier of each of the
+            ``id_types`` by schema, and the value of every normalization
+            function.
+        """
+        try:
+            lookup_key = _get_lookup_key(author)
+            return self._keys[lookup_key]
+        except TypeError:
+            # Some malformed values can't be hashed, don't keep their keys.
+            return self._compute(author)
+        except KeyError:
+            keys = self._keys[lookup_key] = self._compute(author)
+            return keys
+
+    def _compute(self, author):
+        return (
+            _get_ids(author, self.id_types),
+            tuple(norm_function(author) for norm_function in self.norm_functions),
+        )
+
+
+def _get_lookup_key(author):
+    ids = tuple(
+        (id_field.get('schema'), id_field.get('value'))
+        for id_field in author.get('ids', [])
+    )
+    return 'full_name' in author, author.get('full_name'), ids
+
+
+def _get_ids(author, id_types):
+    """Map each of the ``id_types`` to the first such identifier of an author."""
+    ids = {}
+    for id_field in author.get('ids', []):
+        schema = id_field.get('schema')
+        if schema in id_types and schema not in ids:
+            ids[schema] = id_field.get('value')
+    return ids
+
+
+class _IDGetter(object):
+    """Get an identifier of an ``((index, keys), author)`` pair."""
+
+    def __init__(self, id_type):
+        self.id_type = id_type
+
+    def __call__(self, element):
+        return element[0][1][0].get(self.id_type)
+
+
+class _NameGetter(object):
+    """Get a normalized name of an ``((index, keys), author)`` pair."""
+
+    def __init__(self, position):
+        self.position = position
+
+    def __call__(self, element):
+        return element[0][1][1][self.position]
+
+
+def _match_residue(
+    l1,
+    l2,
+    threshold,
+    distance_function,
+    max_munkres_size,
+    executor=None,
+    budget=None,
+):
+    """Match the ``(index, author)`` pairs left by the normalization functions.
+
+    The authors closer than the threshold are split into connected
+    components, matched by ``_match_components``. The distances are computed
+    in batches, see ``distances.get_distances``.
+
+    With an ``executor``, the distances and the components are split in
+    chunks run by it, and the results are put back together in the same
+    order as without it.
+
+    Raises:
+        MatchingBudgetExceeded: if the ``budget`` is exceeded.
+    """
+    if budget is None:
+        budget = _Budget()
+    authors1 = [author for _, author in l1]
+    authors2 = [author for _, author in l2]
+    pairs = get_candidate_pairs(
+        authors1, authors2, threshold, distance_function, budget
+    )
+    if executor is None and budget.deadline is None:
+        pair_distances = get_distances(authors1, authors2, pairs, distance_function)
+    elif executor is None:
+        # Check the time between chunks of pairs.
+        pair_distances = []
+        for start in range(0, len(pairs), PARALLEL_CHUNK_PAIRS):
+            budget.check_time()
+            pair_distances.extend(
+                get_distances(
+                    authors1,
+                    authors2,
+                    pairs[start : start + PARALLEL_CHUNK_PAIRS],
+                    distance_function,
+                )
+            )
+    else:
+        pair_distances = _get_distances_in_parallel(
+            executor, authors1, authors2, pairs, distance_function
+        )
+
+    distances = {}
+    components = BipartiteConnectedComponents()
+    for index, (i1, i2) in enumerate(pairs):
+        distance = distances[i1, i2] = pair_distances[index]
+        if distance <= threshold:
+            components.add_edge(i1, i2)
+
+    # Give every component the elements and the distances it contains.
+    parts = []
+    part_of_l1 = {}
+    part_of_l2 = {}
+    for l1_indices, l2_indices in components.get_connected_components():
+        for i1 in l1_indices:
+            part_of_l1[i1] = len(parts)
+        for i2 in l2_indices:
+            part_of_l2[i2] = len(parts)
+        parts.append(
+            (
+                [(i1, authors1[i1]) for i1 in l1_indices],
+                [(i2, authors2[i2]) for i2 in l2_indices],
+                {},
+            )
+        )
+    for (i1, i2), distance in distances.items():
+        part = part_of_l1.get(i1)
+        if part is not None and part == part_of_l2.get(i2):
+            parts[part][2][i1, i2] = distance
+
+    budget.check_time()
+    args = (threshold, distance_function, max_munkres_size)
+    if executor is None:
+        matches = _match_components(parts, *args, budget=budget)
+    else:
+        matches = []
+        for chunk in _submit_chunks(
+            executor, _match_components, _chunk_parts(parts), *args
+        ):
+            matches.extend(chunk)
+        budget.check_time()
+    return [(l1[i1], l2[i2]) for i1, i2 in matches]
+
+
+def _match_components(
+    parts, threshold, distance_function, max_munkres_size, budget=None
+):
+    """Match the elements of connected components.
+
+    The components small enough are solved with the Munkres algorithm, on the
+    same matrices as ``distance_function_match``: the distances not computed
+    yet are filled in, they're all above the threshold. The other ones only
+    use the pairs under the threshold, see ``_match_greedy``.
+
+    Args:
+        parts (list): the ``(elements1, elements2, distances)`` of every
+            component, where the elements are ``(index, author)`` pairs, and
+            the distances map the ``(index1, index2)`` pairs computed to their
+            distance.
+        threshold (float): the maximum distance between matching authors.
+        distance_function (AuthorNameDistanceCalculator): the distance
+            between two authors.
+        max_munkres_size (int): see ``match_authors``.
+        budget (_Budget): if given, its time is checked before every
+            component.
+
+    Returns:
+        list: the ``(index1, index2)`` pairs of matching elements.
+    """
+    matches = []
+    for elements1, elements2, distances in parts:
+        if budget is not None:
+            budget.check_time()
+        if max(len(elements1), len(elements2)) > max_munkres_size:
+            matches.extend(
+                _match_greedy(
+                    {
+                        pair: distance
+                        for pair, distance in distances.items()
+                        if distance <= threshold
+                    }
+                )
+            )
+            continue
+        authors1 = dict(elements1)
+        authors2 = dict(elements2)
+        missing = [
+            (i1, i2)
+            for i1, _ in elements1
+            for i2, _ in elements2
+            if (i1, i2) not in distances
+        ]
+        missing_distances = get_distances(
+            authors1, authors2, missing, distance_function
+        )
+        for index, pair in enumerate(missing):
+            distances[pair] = missing_distances[index]
+        part_dist_matrix = [
+            [distances[i1, i2] for i2, _ in elements2] for i1, _ in elements1
+        ]
+        matches.extend(
+            (c1[0], c2[0])
+            for c1, c2 in _match_munkres(
+                elements1, elements2, part_dist_matrix, threshold
+            )
+        )
+    return matches
+
+
+def _get_distances_in_parallel(
+    executor, authors1, authors2, pairs, distance_function
+):
+    """Compute ``get_distances`` in chunks of pairs run by the executor.
+
+    Every chunk only gets the authors of its pairs, so that they don't all
+    have to be sent to the worker processes.
+    """
+    chunks = []
+    for start in range(0, len(pairs), PARALLEL_CHUNK_PAIRS):
+        chunk = pairs[start : start + PARALLEL_CHUNK_PAIRS]
+        chunks.append(
+            (
+                {i1: authors1[i1] for i1, _ in chunk},
+                {i2: authors2[i2] for _, i2 in chunk},
+                chunk,
+            )
+        )
+    distances = []
+    for chunk_distances in _submit_chunks(
+        executor, _get_chunk_distances, chunks, distance_function
+    ):
+        distances.extend(chunk_distances)
+    return distances
+
+
+def _get_chunk_distances(chunk, distance_function):
+    authors1, authors2, pairs = chunk
+    return get_distances(authors1, authors2, pairs, distance_function)
+
+
+def _chunk_parts(parts):
+    """Group consecutive components in chunks of about the same size."""
+    chunks = []
+    chunk = []
+    size = 0
+    for part in parts:
+        chunk.append(part)
+        size += len(part[0]) * len(part[1])
+        if size >= PARALLEL_CHUNK_PAIRS:
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _submit_chunks(executor, function, chunks, *args):
+    """Run ``function(chunk, *args)`` for every chunk with the executor.
+
+    Returns:
+        list: the results, in the order of the chunks.
+    """
+    futures = [executor.submit(function, chunk, *args) for chunk in chunks]
+    return [future.result() for future in futures]
+
+
+def _match_greedy(distances):
+    """Match the closest pairs first, only looking at the given distances.
+
+    Like ``_match_munkres`` does for the pairs it picks, every pair chosen
+    also matches the pairs on its row and column at the same distance.
+
+    Args:
+        distances (dict): the distance of each ``(i1, i2)`` pair which can
+            match.
+
+    Returns:
+        set: the matching ``(i1, i2)`` pairs.
+    """
+    rows = defaultdict(list)
+    columns = defaultdict(list)
+    for (i1, i2), distance in distances.items():
+        rows[i1].append((i2, distance))
+        columns[i2].append((i1, distance))
+
+    matches = set()
+    matched1 = set()
+    matched2 = set()
+    for distance, i1, i2 in sorted(
+        (distance, i1, i2) for (i1, i2), distance in distances.items()
+    ):
+        if i1 in matched1 or i2 in matched2:
+            continue
+        matched1.add(i1)
+        matched2.add(i2)
+        matches.update(
+            (i1, other) for other, other_distance in rows[i1]
+            if abs(distance - other_distance) < 1e-9
+        )
+        matches.update(
+            (other, i2) for other, other_distance in columns[i2]
+            if abs(distance - other_distance) < 1e-9
+        )
+    return matches
+
+
+def get_candidate_pairs(authors1, authors2, threshold, distance_function, budget=None):
+    """Return the sorted pairs of indices of authors that might match.
+
+    ``AuthorNameDistanceCalculator`` matches the name tokens of two authors
+    and averages their distances, so two authors are at most ``threshold``
+    apart only if at least one pair of their tokens is. Two tokens are that
+    close only if:
+
+    * both are initials and they are equal;
+    * one is an initial and the other one starts with it;
+    * their edit distance is at most 1, so they are equal after deleting at
+      most one character from each;
+    * or both are long enough for an edit distance of 2 or more to be under
+      the threshold.
+
+    Every case has its blocking keys, and only the authors sharing a key are
+    returned.
+
+    Raises:
+        MatchingBudgetExceeded: if there are more pairs than allowed by the
+            ``budget``, or if its time is over.
+    """
+    if budget is None:
+        budget = _Budget()
+    if threshold >= 1:
+        # Also authors without names or with initials only can match.
+        budget.check_pairs(len(authors1) * len(authors2))
+        return [(i1, i2) for i1 in range(len(authors1)) for i2 in range(len(authors2))]
+
+    long_token_length = _get_long_token_length(threshold)
+    index = defaultdict(set)
+    for i2, author in enumerate(authors2):
+        for token in _get_name_tokens(author, distance_function):
+            if isinstance(token, NameInitial):
+                index['initial', token.token].add(i2)
+                continue
+            for key in _get_deletion_keys(token.token):
+                index['deletion', key].add(i2)
+            index['first_letter', token.token[0]].add(i2)
+            if len(token.token) >= long_token_length:
+                index['long_token'].add(i2)
+
+    pairs = []
+    for i1, author in enumerate(authors1):
+        keys = set()
+        for token in _get_name_tokens(author, distance_function):
+            if isinstance(token, NameInitial):
+                keys.add(('initial', token.token))
+                keys.add(('first_letter', token.token))
+                continue
+            keys.update(('deletion', key) for key in _get_deletion_keys(token.token))
+            keys.add(('initial', token.token[0]))
+            if len(token.token) >= long_token_length:
+                keys.add('long_token')
+        candidates = set()
+        for key in keys:
+            candidates.update(index.get(key, ()))
+        pairs.extend((i1, i2) for i2 in sorted(candidates))
+        budget.check_pairs(len(pairs))
+        budget.check_time()
+    return pairs
+
+
+def _get_long_token_length(threshold):
+    """Minimum length of two tokens with edit distance 2 and under threshold.
+
+    The normalized edit distance of two tokens is at least ``2 / L`` where
+    ``L`` is the length of the longest one, and the shortest one is at least
+    ``L * (1 - threshold)`` long.
+    """
+    if threshold <= 0:
+        return float('inf')
+    return int(2 / threshold * (1 - threshold))
+
+
+def _get_name_tokens(author, distance_function):
+    """Tokenize a name like ``AuthorNameDistanceCalculator`` does."""
+    name = author.get(distance_function.name_field)
+    if name is None:
+        return []
+    tokens = distance_function.tokenize_function(
+        _asciify(_decode_if_not_unicode(name))
+    )
+    return [
+        token for token in tokens['lastnames'] + tokens['nonlastnames'] if token.token
+    ]
+
+
+def _get_deletion_keys(token):
+    """The token, and the token without each of its characters."""
+    keys = {token}
+    keys.update(token[:i] + token[i + 1:] for i in range(len(token)))
+    return keys
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Merge plans compiled once per merger configuration."""
+
+from __future__ import absolute_import, division, print_function
+
+from json_merger.merger import Merger
+
+from inspire_json_merger.comparators import AuthorComparator
+from inspire_json_merger.utils import ConflictFilter, FilterPipeline
+
+_MERGE_PLANS = {}
+
+
+class MergePlan(object):
+    """The configuration-dependent part of a merge, prepared once.
+
+    Everything that only depends on a ``MergerConfigurationOperations``
+    subclass is read from it once: the pre-filter chain, which is grouped in
+    a ``FilterPipeline``, the arguments of the ``Merger`` and the conflict
+    filters, which are compiled in a ``ConflictFilter``. Only the
+    record-dependent work is left to be done for every merge.
+
+    If the ``authors`` are matched by an ``AuthorComparator``, the keys of
+    the authors of the three records are computed once per merge, instead of
+    once by each of the comparators, see ``get_merger``.
+
+    Plans are cached by ``get_merge_plan``. The merge operations and
+    comparators dictionaries are shared with the configuration, but the
+    filter lists are copied, so ``clear_merge_plans`` has to be called if
+    they are changed after a merge used the configuration.
+    """
+
+    def __init__(self, configuration):
+        self.configuration = configuration
+        self.pre_filters = tuple(configuration.pre_filters)
+        self.filter_pipeline = FilterPipeline(self.pre_filters)
+        self.conflict_filter = ConflictFilter(configuration.conflict_filters)
+        self.merger_options = {
+            'default_dict_merge_op': configuration.default_dict_merge_op,
+            'default_list_merge_op': configuration.default_list_merge_op,
+            'list_dict_ops': configuration.list_dict_ops,
+            'list_merge_ops': configuration.list_merge_ops,
+            'comparators': configuration.comparators,
+        }
+        author_comparator = (configuration.comparators or {}).get('authors')
+        if not (
+            isinstance(author_comparator, type)
+            and issubclass(author_comparator, AuthorComparator)
+        ):
+            author_comparator = None
+        self.author_comparator = author_comparator
+
+    def filter_records(self, root, head, update, **options):
+        """Apply the pre-filters to the records, see ``utils.FilterPipeline``."""
+        return self.filter_pipeline(root, head, update, **options)
+
+    def get_filtered_fields(self, fields):
+        """Get the fields the pre-filters need to filter the given ones.
+
+        Args:
+            fields (Set): top-level fields of the records.
+
+        Returns:
+            frozenset: ``fields`` and the other fields used by the pre-filters
+            sharing some field with them, or ``None`` if some pre-filter
+            doesn't declare its fields, so it needs the whole records.
+        """
+        groups = self.filter_pipeline.groups
+        if groups is None:
+            return None
+        filtered_fields = set(fields)
+        for group_fields, _ in groups:
+            if group_fields & filtered_fields:
+                filtered_fields.update(group_fields)
+        return frozenset(filtered_fields)
+
+    def get_merger(self, root, head, update):
+        """Return a ``Merger`` for the given records."""
+        merger_options = self.merger_options
+        if self.author_comparator and ('authors' in head or 'authors' in update):
+            comparators = dict(merger_options['comparators'])
+            comparators['authors'] = self.author_comparator.with_author_keys(
+                root.get('authors', []),
+                head.get('authors', []),
+                update.get('authors', []),
+            )
+            merger_options = dict(merger_options, comparators=comparators)
+        return Merger(root=root, head=head, update=update, **merger_options)
+
+    def get_degraded_reason(self, merger):
+        """Tell why the authors of a merge were matched by position, if so.
+
+        Returns:
+            str: the ``degraded_reason`` of the ``AuthorComparator`` of the
+            merger, ``None`` if the authors were fully matched.
+        """
+        comparator = merger.comparators.get('authors')
+        matching_stats = getattr(comparator, 'matching_stats', None)
+        return (matching_stats or {}).get('degraded_reason')
+
+    def filter_conflicts(self, conflicts):
+        """Remove the conflicts matched by the configuration conflict filters.
+
+        It does the same as ``utils.filter_conflicts``, with the filters
+        compiled once.
+        """
+        return self.conflict_filter(conflicts)
+
+
+def get_merge_plan(configuration):
+    """Return the cached ``MergePlan`` of a configuration, compiling it once."""
+    try:
+        return _MERGE_PLANS[configuration]
+    except KeyError:
+        plan = _MERGE_PLANS[configuration] = MergePlan(configuration)
+        return plan
+
+
+def clear_merge_plans():
+    """Forget the compiled plans, to be used after changing a configuration."""
+    _MERGE_PLANS.clear()
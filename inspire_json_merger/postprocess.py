@@ -23,61 +23,107 @@ from __future__ import absolute_import, division, print_function
 
 import itertools
 import json
-
-try:
-    from collections.abc import Iterable
-except ImportError:
-    from collections import Iterable
+import warnings
+from collections import defaultdict
 
 from json_merger.conflict import Conflict
-from pyrsistent import thaw
-
-from inspire_json_merger.utils import ORDER_KEY
+from pyrsistent import freeze, thaw
 
 
-def postprocess_results(merged, conflicts):
+def postprocess_results(merged, conflicts, author_positions=None):
     """Run all postprocessing to provide output understandable by record-editor.
 
     Args:
         merged(dict): Merged document
         conflicts(list): List of all possible conflicts
+        author_positions(AuthorPositions): Positions of the authors in head,
+            to put back the head authors from conflicts close to their
+            original position.
 
     Returns: A tuple containing the resulted merged record in json format and a
         an list containing all generated conflicts.
 
     """
 
-    conflicts, merged = postprocess_conflicts(conflicts, merged)
+    conflicts, merged = postprocess_conflicts(conflicts, merged, author_positions)
     conflicts_as_json = [json.loads(c.to_json()) for c in conflicts]
-    flat_conflicts_as_json = remove_ordering_from_conflicts(
-        list(itertools.chain.from_iterable(conflicts_as_json))
-    )
-    merged = remove_ordering_from_authors_merged(merged)
+    flat_conflicts_as_json = list(itertools.chain.from_iterable(conflicts_as_json))
 
     return merged, flat_conflicts_as_json
 
 
+class AuthorPositions(object):
+    """Positions of the authors in head, kept aside from the records.
+
+    The merged authors coming from head are found through the head authors
+    the merger aligned with them, which are the same objects as its copy of
+    the head authors. The authors of the conflicts are copies, they are
+    found by their content.
+
+    Args:
+        head_authors(list): the authors of the head given to the merger.
+        aligned_head_authors(list): the head authors aligned with the merged
+            ones by the merger.
+    """
+
+    def __init__(self, head_authors, aligned_head_authors):
+        self.head_authors = head_authors
+        positions = {
+            id(author): position for position, author in enumerate(head_authors)
+        }
+        #: Position in head of every merged author, ``None`` if it isn't there.
+        self.merged = [positions.get(id(author)) for author in aligned_head_authors]
+        self._positions_by_content = None
+
+    @classmethod
+    def from_merger(cls, merger):
+        return cls(
+            merger.head.get("authors", []), merger.aligned_head.get("authors", [])
+        )
+
+    def get(self, author):
+        """Get the position in head of an author, ``None`` if it isn't there.
+
+        If head contains the same author several times, the first position
+        is returned.
+        """
+        if self._positions_by_content is None:
+            self._positions_by_content = defaultdict(list)
+            for position, head_author in enumerate(self.head_authors):
+                self._positions_by_content[freeze(head_author)].append(position)
+        positions = self._positions_by_content.get(freeze(author))
+        return positions[0] if positions else None
+
+
 def remove_ordering_from_conflicts(conflicts):
-    """Cleans up ordering information in conflicts."""
-    for conflict in conflicts:
-        if isinstance(conflict["value"], dict):
-            conflict["value"].pop(ORDER_KEY, None)
+    """Deprecated, returns the conflicts as they are.
+
+    The conflicts don't get ordering information anymore. This will be
+    removed in the next release.
+    """
+    warnings.warn(
+        'remove_ordering_from_conflicts is deprecated and does nothing',
+        DeprecationWarning,
+        stacklevel=2,
+    )
     return conflicts
 
 
 def remove_ordering_from_authors_merged(merged):
-    """Cleans up ordering information in merged record."""
-    authors = []
-    if "authors" in merged:
-        for author in merged["authors"]:
-            author = thaw(author)
-            author.pop(ORDER_KEY, None)
-            authors.append(author)
-        merged["authors"] = authors
+    """Deprecated, returns the merged record as it is.
+
+    The authors don't get ordering information anymore. This will be
+    removed in the next release.
+    """
+    warnings.warn(
+        'remove_ordering_from_authors_merged is deprecated and does nothing',
+        DeprecationWarning,
+        stacklevel=2,
+    )
     return merged
 
 
-def postprocess_conflicts(conflicts, merged):
+def postprocess_conflicts(conflicts, merged, author_positions=None):
     """Postprocessing conflicts to display only useful conflicts.
 
     Before flattening and serializing to JSON patch, MERGE conflict looks like this:
@@ -91,10 +137,17 @@ def postprocess_conflicts(conflicts, merged):
     Args:
         conflicts(list): List of all possible conflicts
         merged(dict): Merged document
+        author_positions(AuthorPositions): Positions of the authors in head.
 
     Returns: A tuple containing the resulted merged record in json format and a
         an list containing all generated conflicts.
     """
+    merged_positions = None
+    if author_positions is not None and len(author_positions.merged) == len(
+        merged.get("authors", [])
+    ):
+        # Updated with the authors inserted, to place the next ones.
+        merged_positions = list(author_positions.merged)
     new_conflicts = []
     possible_duplicates = set()
     conflicts = sorted(conflicts, key=lambda conflict: conflict[0])
@@ -104,7 +157,7 @@ def postprocess_conflicts(conflicts, merged):
         conflict_type, conflict_location, conflict_content = conflict
         if conflict_type == "MANUAL_MERGE" and conflict_location[0] == "authors":
             new_conflict, merged, head = _process_author_manual_merge_conflict(
-                conflict, merged
+                conflict, merged, author_positions, merged_positions
             )
             if new_conflict:
                 new_conflicts, conflicts = add_conflict(
@@ -113,7 +166,9 @@ def postprocess_conflicts(conflicts, merged):
                 possible_duplicates.add(head)
         elif not _is_conflict_duplicated(conflict, possible_duplicates):
             if conflict_type == "ADD_BACK_TO_HEAD":
-                new_conflict, merged = _process_add_back_to_head(conflict, merged)
+                new_conflict, merged = _process_add_back_to_head(
+                    conflict, merged, author_positions, merged_positions
+                )
                 new_conflicts, conflicts = add_conflict(
                     new_conflict, new_conflicts, conflicts
                 )
@@ -163,7 +218,9 @@ def update_conflicts_list(conflict, conflict_list):
     return conflict_list
 
 
-def _process_add_back_to_head(conflict, merged):
+def _process_add_back_to_head(
+    conflict, merged, author_positions=None, merged_positions=None
+):
     """Process ADD_BACK_TO_HEAD conflicts differently than other conflicts.
 
     Replace all ADD_BACK_TO_HEAD conflicts to became REMOVE_FIELD conflicts
@@ -172,8 +229,8 @@ def _process_add_back_to_head(conflict, merged):
     """
     conflict_type, conflict_location, conflict_content = conflict
     if conflict_location[0] == "authors":
-        position, merged["authors"] = _insert_to_list(
-            conflict_content, merged["authors"]
+        position, merged["authors"] = _insert_author(
+            conflict_content, merged["authors"], author_positions, merged_positions
         )
         insert_path = ("authors", position)
         new_conflict = Conflict("REMOVE_FIELD", insert_path, None)
@@ -232,7 +289,9 @@ def _is_conflict_duplicated(conflict, possible_duplicates):
     )
 
 
-def _process_author_manual_merge_conflict(conflict, merged):
+def _process_author_manual_merge_conflict(
+    conflict, merged, author_positions=None, merged_positions=None
+):
     """Process author `MANUAL_MERGE` conflict.
 
     Conflict object is an tuple containing:
@@ -241,35 +300,52 @@ def _process_author_manual_merge_conflict(conflict, merged):
     """
     _, _, (root, head, update) = conflict
     if head and head not in merged["authors"]:
-        position, merged["authors"] = _insert_to_list(head, merged["authors"])
+        position, merged["authors"] = _insert_author(
+            head, merged["authors"], author_positions, merged_positions
+        )
         new_conflict = Conflict("SET_FIELD", ("authors", position), update)
         return new_conflict, merged, head
     return None, merged, head
 
 
-def _insert_to_list(item, objects_list, position=None):
+def _insert_author(author, authors, author_positions, merged_positions):
+    """Inserts a head author into the merged authors, see `_insert_to_list`."""
+    position = None
+    if author_positions is not None and merged_positions is not None:
+        position = author_positions.get(author)
+    return _insert_to_list(author, authors, position, merged_positions)
+
+
+def _insert_to_list(item, objects_list, position=None, positions=None):
     """Inserts value into list at proper position (as close to requested
         position as possible but not before it).
 
     If no position provided element will be added at the end of the list.
     Args:
-        item: Value to insert into objects_list with `ORDER_KEY` key
+        item: Value to insert into objects_list
         objects_list(list): List where value should be inserted
-        position(int): If set then use this position instead `ORDER_KEY` key
+        position(int): Position requested for the item
+        positions(list): If set, the requested positions of the elements of
+            objects_list, ``None`` for the ones without. The item is placed
+            before the first element requested after it, and its position
+            is inserted as well.
 
     Returns(tuple): (position on which it was placed, merged objects_list).
     """
     item = thaw(item)
-    if not position and ORDER_KEY in item:
-        position = item[ORDER_KEY]
     if position is not None:
-        for idx, element in enumerate(objects_list):
-            if isinstance(element, Iterable) and ORDER_KEY in element:
-                if element[ORDER_KEY] > position:
-                    objects_list.insert(idx, item)
-                    return idx, objects_list
+        for idx in range(len(objects_list)):
+            element_position = positions[idx] if positions is not None else None
+            if element_position is not None:
+                if element_position > position:
+                    break
             elif idx > position:
-                objects_list.insert(idx, item)
-                return idx, objects_list
-    objects_list.append(item)
-    return len(objects_list) - 1, objects_list
+                break
+        else:
+            idx = len(objects_list)
+    else:
+        idx = len(objects_list)
+    objects_list.insert(idx, item)
+    if positions is not None:
+        positions.insert(idx, position)
+    return idx, objects_list
@@ -24,14 +24,19 @@
 
 from __future__ import absolute_import, division, print_function
 
+import hashlib
+import json
+import warnings
 from functools import partial
 
-import pyrsistent
 from inspire_utils.record import get_value
 from pyrsistent import freeze, ny, pmap, thaw
 from six.moves import zip
 
-from inspire_json_merger.utils import ORDER_KEY
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
 FIELDS_WITH_MATERIAL_KEY = [
     'dois',
@@ -44,6 +49,37 @@ FIELDS_WITH_MATERIAL_KEY = [
 ]
 
 
+# Keys of a reference, and of its ``reference``, which are ignored to tell
+# whether the references were curated.
+IGNORED_REFERENCE_KEYS = frozenset(['record', 'raw_refs'])
+IGNORED_REFERENCE_CONTENT_KEYS = frozenset(['misc', 'authors'])
+
+
+def uses_fields(*fields, **kwargs):
+    """Declare the top-level fields a pre-filter reads or changes.
+
+    ``utils.filter_records`` only freezes these fields of the records when
+    all the filters declare theirs, and passes the other ones through as
+    they are. The records given to the filter may then lack other fields,
+    and the fields it returns replace the declared ones.
+
+    Args:
+        fields: the fields used by the filter.
+        options (list): the keyword arguments of the filter, which are given
+            to it by ``utils.FilterPipeline`` when they're set.
+    """
+    options = frozenset(kwargs.pop('options', ()))
+    if kwargs:
+        raise TypeError('Unexpected arguments: %s' % ', '.join(sorted(kwargs)))
+
+    def decorator(filter_):
+        filter_.fields = frozenset(fields)
+        filter_.options = options
+        return filter_
+
+    return decorator
+
+
 def remove_elements_with_source(source, field):
     """Remove all elements matching ``source`` in ``field``."""
     return freeze(
@@ -94,7 +130,8 @@ def keep_only_update_source_in_field(field, root, head, update):
     return root, head, update
 
 
-def filter_curated_references(root, head, update):
+@uses_fields('references', options=['reference_fingerprints'])
+def filter_curated_references(root, head, update, reference_fingerprints=None):
     """Remove references from either ``head`` or ``update`` depending on curation.
 
     If references have been curated, then it removes all references from the
@@ -105,6 +142,9 @@ def filter_curated_references(root, head, update):
         root (pmap): the root record.
         head (pmap): the head record.
         update (pmap): the update record.
+        reference_fingerprints (dict): the fingerprints of the references
+            of root and head, if they were computed before. See
+            ``get_stored_reference_fingerprints``.
 
     Returns:
         tuple: ``(root, head, update)`` with ``references`` removed from ``root``
@@ -114,7 +154,9 @@ def filter_curated_references(root, head, update):
         return root, head, update
 
     references_curated = are_references_curated(
-        root.get('references', []), head.get('references', [])
+        root.get('references', []),
+        head.get('references', []),
+        reference_fingerprints,
     )
     if 'references' in root:
         root = root.remove('references')
@@ -126,6 +168,7 @@ def filter_curated_references(root, head, update):
     return root, head, update
 
 
+@uses_fields('references')
 def filter_publisher_references(root, head, update):
     """Remove references from ``update`` if there are any in ``head``.
 
@@ -139,93 +182,170 @@ def filter_publisher_references(root, head, update):
     return root, head, update
 
 
-def update_authors_with_ordering_info(root, head, update):
-    """Adds ordering information into authors entries.
+def are_references_curated(root_refs, head_refs, reference_fingerprints=None):
+    """Tell whether the references of head were changed by curators.
 
-    This is helpful so we won't loose correct ordering on conflicts.
-    Args:
-        root (pmap): the root record.
-        head (pmap): the head record.
-        update (pmap): the update record.
+    The references are compared by their fingerprints, see
+    ``get_reference_fingerprint``, stopping at the first difference. The
+    fingerprints stored in ``reference_fingerprints`` are used instead of
+    computing them if they're still valid, see
+    ``get_stored_reference_fingerprints``.
+    """
+    if not root_refs:
+        return any('legacy_curated' in head_ref for head_ref in head_refs)
 
-    Returns: A tuple containing root, head and update with authors data
-        enriched with ordering information
+    if len(root_refs) != len(head_refs):
+        return True
 
-    """
-    if 'authors' in head:
-        head = head.update(
-            {"authors": _update_authors_list_with_ordering_data(head["authors"])}
+    return any(
+        root != head
+        for root, head in zip(
+            _iter_fingerprints(root_refs, reference_fingerprints, 'root'),
+            _iter_fingerprints(head_refs, reference_fingerprints, 'head'),
         )
-    return root, head, update
+    )
 
 
-def _update_authors_list_with_ordering_data(input_list):
-    positions = iter(range(len(input_list)))
-    return input_list.transform(
-        [pyrsistent.ny], lambda element: element.set(ORDER_KEY, (next(positions)))
+def _iter_fingerprints(references, reference_fingerprints, key):
+    fingerprints = get_stored_reference_fingerprints(
+        reference_fingerprints, key, references
     )
+    if fingerprints is not None:
+        return iter(fingerprints)
+    return (get_reference_fingerprint(reference) for reference in references)
 
 
-def are_references_curated(root_refs, head_refs):
-    if not root_refs:
-        return any('legacy_curated' in head_ref for head_ref in head_refs)
+def get_stored_reference_fingerprints(reference_fingerprints, key, references):
+    """Get the stored fingerprints of ``references``, if they're still valid.
 
-    if len(root_refs) != len(head_refs):
-        return True
+    ``reference_fingerprints`` stores, for ``key`` being ``root`` or
+    ``head``, the list of fingerprints of the references of that record
+    under ``key`` and the digest of these references under ``key +
+    '_digest'``, see ``get_references_digest``. The references can be
+    changed outside of merges, e.g. by curators, so the fingerprints are
+    only valid if the digest is the one of ``references``.
 
-    return not all(
-        ref_almost_equal(root, head) for root, head in zip(root_refs, head_refs)
-    )
+    Args:
+        reference_fingerprints (dict): the stored fingerprints, or ``None``.
+        key (str): ``root`` or ``head``.
+        references (Sequence): the current references of that record.
+
+    Returns:
+        list: the fingerprints of ``references``, or ``None`` if there are
+        no valid ones.
+    """
+    if not reference_fingerprints:
+        return None
+    fingerprints = reference_fingerprints.get(key)
+    if fingerprints is None or len(fingerprints) != len(references):
+        return None
+    if reference_fingerprints.get(key + '_digest') != get_references_digest(
+        references
+    ):
+        return None
+    return fingerprints
 
 
 def ref_almost_equal(root_ref, head_ref):
-    return _normalize_ref(root_ref) == _normalize_ref(head_ref)
+    return get_reference_fingerprint(root_ref) == get_reference_fingerprint(head_ref)
+
+
+def get_reference_fingerprint(reference):
+    """Get a hash of the parts of a reference that curators can change.
 
+    Two references have the same fingerprint when they are equal ignoring
+    their ``record``, ``raw_refs`` and false ``curated_relation``, and the
+    ``misc`` and ``authors`` of their ``reference``. The reference is
+    serialized to canonical JSON in a single traversal, so the fingerprint
+    doesn't depend on the process and can be stored.
 
-def _normalize_ref(ref):
-    ref = _remove_if_present(ref, 'record')
-    ref = _remove_if_falsy(ref, 'curated_relation')
-    ref = _remove_if_present(ref, 'raw_refs')
-    ref = ref.transform(
-        ['reference'], lambda reference: _remove_if_present(reference, 'misc')
+    Args:
+        reference (Mapping): the reference, frozen or not.
+
+    Returns:
+        str: the hexadecimal SHA-1 digest of the reference.
+    """
+    content = {
+        key: value
+        for key, value in reference.items()
+        if key not in IGNORED_REFERENCE_KEYS
+        and (key != 'curated_relation' or value)
+    }
+    content['reference'] = {
+        key: value
+        for key, value in reference.get('reference', {}).items()
+        if key not in IGNORED_REFERENCE_CONTENT_KEYS
+    }
+    serialized = json.dumps(
+        content, sort_keys=True, separators=(',', ':'), default=_to_json
     )
-    ref = ref.transform(
-        ['reference'], lambda reference: _remove_if_present(reference, 'authors')
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def get_reference_fingerprints(references):
+    """Get the fingerprint of every reference, see ``get_reference_fingerprint``.
+
+    Returns:
+        list: the fingerprints, in the order of the references.
+    """
+    return [get_reference_fingerprint(reference) for reference in references]
+
+
+def get_references_digest(references):
+    """Get a hash of a whole list of references, in all their parts.
+
+    Unlike the fingerprints, it changes whenever anything in the references
+    changes, so it tells whether fingerprints computed before are still the
+    ones of the references.
+
+    Args:
+        references (Sequence): the references, frozen or not.
+
+    Returns:
+        str: the hexadecimal SHA-1 digest of the references.
+    """
+    serialized = json.dumps(
+        references, sort_keys=True, separators=(',', ':'), default=_to_json
     )
-    return ref
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
 
 
-def _remove_if_present(pmap, key):
-    try:
-        return pmap.remove(key)
-    except KeyError:
-        return pmap
+def _to_json(value):
+    """Convert the frozen values for ``json.dumps``."""
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    return list(value)
 
 
-def _remove_if_falsy(pmap, key):
+def _remove_if_present(pmap, key):
     try:
-        if not pmap[key]:
-            return pmap.remove(key)
-        return pmap
+        return pmap.remove(key)
     except KeyError:
         return pmap
 
 
+@uses_fields('references')
 def remove_references_from_update(root, head, update):
     update = _remove_if_present(update, "references")
     return root, head, update
 
 
+@uses_fields('acquisition_source')
 def clean_root_for_acquisition_source(root, head, update):
     if root.get("acquisition_source"):
         root = root.remove("acquisition_source")
     return root, head, update
 
 
-filter_documents_same_source = partial(keep_only_update_source_in_field, 'documents')
-filter_figures_same_source = partial(keep_only_update_source_in_field, 'figures')
+filter_documents_same_source = uses_fields('documents', 'acquisition_source')(
+    partial(keep_only_update_source_in_field, 'documents')
+)
+filter_figures_same_source = uses_fields('figures', 'acquisition_source')(
+    partial(keep_only_update_source_in_field, 'figures')
+)
 
 
+@uses_fields(*FIELDS_WITH_MATERIAL_KEY)
 def update_material(root, head, update):
     if "erratum" in get_value(thaw(update), 'dois.material', []):
         return root, head, update
@@ -241,7 +361,24 @@ def remove_root(root, head, update):
     return pmap({}), head, update
 
 
+@uses_fields('preprint_date')
 def remove_root_preprint_date(root, head, update):
     "Workaround for arXiv bug in new OAI-PMH API"
     root = _remove_if_present(root, "preprint_date")
     return root, head, update
+
+
+@uses_fields('authors')
+def update_authors_with_ordering_info(root, head, update):
+    """Deprecated, returns the records as they are.
+
+    The positions of the head authors are now kept aside from the records,
+    see ``postprocess.AuthorPositions``. This will be removed in the next
+    release.
+    """
+    warnings.warn(
+        'update_authors_with_ordering_info is deprecated and does nothing',
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return root, head, update
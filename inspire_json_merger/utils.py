@@ -25,14 +25,75 @@
 from __future__ import absolute_import, division, print_function
 
 import re
+import threading
+from collections import OrderedDict, namedtuple
 
 import six
-from pyrsistent import freeze, thaw
+from pyrsistent import freeze, pmap, thaw
 from six.moves import zip
 
 split_on_re = re.compile(r'[\.\s-]')
 
-ORDER_KEY = "__pos"
+# Deprecated: the authors don't get their position under this key anymore,
+# see ``postprocess.AuthorPositions``. This will be removed in the next
+# release.
+ORDER_KEY = '__pos'
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+    """Thread-safe cache of the ``maxsize`` most recently used values.
+
+    Unlike ``functools.lru_cache`` it works on Python 2, and its size can be
+    changed after it's created. A ``maxsize`` of 0 disables caching.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Return the value of ``key``, calling ``compute(key)`` if missing."""
+        with self._lock:
+            try:
+                value = self._values.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._values[key] = value
+                return value
+
+        value = compute(key)
+        with self._lock:
+            self._values[key] = value
+            self._evict()
+        return value
+
+    def info(self):
+        """Return the hits, misses, maximum and current size of the cache."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._values))
+
+    def resize(self, maxsize):
+        """Change the maximum size, evicting the oldest values if needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """Remove all the values and reset the statistics."""
+        with self._lock:
+            self._values.clear()
+            self.hits = self.misses = 0
+
+    def _evict(self):
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
 
 
 def scan_author_string_for_phrases(s):
@@ -105,10 +166,53 @@ def filter_conflicts(conflicts_list, fields):
     Return:
         List[Conflict]: the given list filtered by `fields`
     """
-    for field in fields:
-        conflicts_list = filter_conflicts_by_path(conflicts_list, field)
+    return ConflictFilter(fields)(conflicts_list)
+
+
+class ConflictFilter(object):
+    """Conflict filters compiled into a prefix trie of their keys.
+
+    A conflict is filtered out when one of the paths is a prefix of its path
+    without the list indices, like ``is_to_delete`` checks, and it's checked
+    against all the paths in a single walk of its path.
+
+    Args:
+        fields(List[str]): paths of the form ``field.subfield.subsubfield``.
+    """
+
+    def __init__(self, fields):
+        self.trie = {}
+        for field in fields:
+            node = self.trie
+            for key in field.split('.'):
+                if _FILTERED in node:
+                    break
+                node = node.setdefault(key, {})
+            else:
+                node.clear()
+                node[_FILTERED] = True
+
+    def __call__(self, conflicts):
+        """Return the conflicts which are not filtered out."""
+        return [conflict for conflict in conflicts if not self.is_filtered(conflict)]
+
+    def is_filtered(self, conflict):
+        if conflict[0] == 'MANUAL_MERGE':
+            return False
+        node = self.trie
+        for key in conflict[1]:
+            if isinstance(key, int):
+                continue
+            node = node.get(key)
+            if node is None:
+                return False
+            if _FILTERED in node:
+                return True
+        return False
 
-    return conflicts_list
+
+# Marks the end of a path in the trie of a ``ConflictFilter``.
+_FILTERED = object()
 
 
 def filter_conflicts_by_path(conflict_list, to_delete_path):
@@ -142,10 +246,204 @@ def conflict_to_list(conflict):
     return [p for p in path if not isinstance(p, int)]
 
 
-def filter_records(root, head, update, filters=()):
-    """Apply the filters to the records."""
-    root, head, update = freeze(root), freeze(head), freeze(update)
+def split_unchanged_fields(root, head, update):
+    """Take out of the records the fields that don't need a three-way merge.
+
+    A top-level field is resolved directly when it is equal in the three
+    records, or when only one side changed it and it doesn't contain any
+    list: for those the merger would just take the changed value without
+    conflicts. Lists changed on a single side still need to be merged, as the
+    list merge operations may drop, reorder or add back their entities.
+
+    Note that this is not always what the merger would return: a list that
+    is unchanged in the three records but contains entities the comparators
+    can't tell apart (e.g. two authors with the same name) makes the merger
+    report spurious ``SET_FIELD`` conflicts on them, which are not reported
+    anymore as the list is resolved as it is.
+
+    Args:
+        root (dict): the root record.
+        head (dict): the head record.
+        update (dict): the update record.
+
+    Returns:
+        tuple: ``(resolved, root, head, update)`` where ``resolved`` contains
+        the values of the resolved fields, which are missing from the
+        returned ``root``, ``head`` and ``update``.
+    """
+    resolved = {}
+    to_merge = set()
+    for field in set(root) | set(head) | set(update):
+        root_value = root.get(field, _MISSING)
+        head_value = head.get(field, _MISSING)
+        update_value = update.get(field, _MISSING)
+        head_unchanged = head_value == root_value
+        update_unchanged = update_value == root_value
+        if head_unchanged and update_unchanged:
+            value = head_value
+        elif _contains_list(head_value) or _contains_list(update_value):
+            to_merge.add(field)
+            continue
+        elif update_unchanged or head_value == update_value:
+            value = head_value
+        elif head_unchanged:
+            value = update_value
+        else:
+            to_merge.add(field)
+            continue
+        if value is not _MISSING:
+            resolved[field] = value
+
+    def keep_fields_to_merge(record):
+        return {key: value for key, value in record.items() if key in to_merge}
+
+    return (
+        resolved,
+        keep_fields_to_merge(root),
+        keep_fields_to_merge(head),
+        keep_fields_to_merge(update),
+    )
+
+
+_MISSING = object()
+
+
+def _contains_list(value):
+    if isinstance(value, list):
+        return True
+    if isinstance(value, dict):
+        return any(_contains_list(item) for item in value.values())
+    return False
+
+
+def filter_records(root, head, update, filters=(), **options):
+    """Apply the filters to the records, see ``FilterPipeline``."""
+    return FilterPipeline(filters)(root, head, update, **options)
+
+
+class FilterPipeline(object):
+    """Pre-filters applied together to the records.
+
+    The filters work on frozen records. If all of them declare the fields
+    they use, see ``pre_filters.uses_fields``, they are grouped by the
+    fields they share, and every group only gets these fields of the
+    records. Each field is frozen once, and the changed fields are thawed
+    back in a single pass at the end. The other fields, and the ones the
+    filters didn't change, are passed through as they are, so they are
+    shared between the given and the returned records.
+
+    If some filter doesn't declare its fields, the whole records are frozen
+    and given to every filter in turn.
+
+    The keyword arguments given when calling the pipeline are passed to
+    the filters declaring them as options, when they're not ``None``.
+
+    Args:
+        filters (list): the filters, called in order on the records of each
+            group.
+    """
+
+    def __init__(self, filters):
+        self.filters = tuple(filters)
+        self.fields = get_filter_fields(self.filters)
+        self.groups = None
+        if self.fields is not None:
+            self.groups = _group_filters(self.filters)
+
+    def __call__(self, root, head, update, **options):
+        if self.groups is None:
+            records = freeze(root), freeze(head), freeze(update)
+            for filter_ in self.filters:
+                records = _call_filter(filter_, records, options)
+            return tuple(thaw(record) for record in records)
+
+        records = (root, head, update)
+        frozen = [
+            {
+                key: freeze(value)
+                for key, value in record.items()
+                if key in self.fields
+            }
+            for record in records
+        ]
+        filtered = [{} for _ in records]
+        for fields, filters in self.groups:
+            group = [
+                pmap({key: value for key, value in values.items() if key in fields})
+                for values in frozen
+            ]
+            for filter_ in filters:
+                group = _call_filter(filter_, group, options)
+            for index, values in enumerate(group):
+                filtered[index].update(values)
+
+        return tuple(
+            self._replace_filtered_fields(record, frozen_values, filtered_values)
+            for record, frozen_values, filtered_values in zip(
+                records, frozen, filtered
+            )
+        )
+
+    def _replace_filtered_fields(self, record, frozen, filtered):
+        """Put the filtered fields back in a record, keeping the order of keys.
+
+        The fields still having their frozen value are taken from the record
+        instead of being thawed.
+        """
+        result = {}
+        for key, value in record.items():
+            if key not in self.fields:
+                result[key] = value
+            elif key in filtered:
+                filtered_value = filtered[key]
+                if filtered_value is not frozen[key]:
+                    value = thaw(filtered_value)
+                result[key] = value
+        for key, value in filtered.items():
+            if key not in result:
+                result[key] = thaw(value)
+        return result
+
+
+def _call_filter(filter_, records, options):
+    accepted = getattr(filter_, 'options', ())
+    kwargs = {
+        key: value
+        for key, value in options.items()
+        if key in accepted and value is not None
+    }
+    return filter_(*records, **kwargs)
+
+
+def get_filter_fields(filters):
+    """Return the fields used by all the filters, ``None`` if unknown."""
+    fields = set()
     for filter_ in filters:
-        root, head, update = filter_(root, head, update)
+        filter_fields = getattr(filter_, 'fields', None)
+        if filter_fields is None:
+            return None
+        fields.update(filter_fields)
+    return fields
 
-    return thaw(root), thaw(head), thaw(update)
+
+def _group_filters(filters):
+    """Group the filters sharing some field, keeping their order.
+
+    Returns:
+        list: the ``(fields, filters)`` of every group, where no field is in
+        two groups.
+    """
+    groups = []
+    for position, filter_ in enumerate(filters):
+        fields = set(filter_.fields)
+        positions = [position]
+        for group in list(groups):
+            if group[0] & fields:
+                groups.remove(group)
+                fields.update(group[0])
+                positions.extend(group[1])
+        groups.append((fields, positions))
+    return [
+        (fields, [filters[position] for position in sorted(positions)])
+        for fields, positions in groups
+    ]
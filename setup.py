@@ -24,7 +24,10 @@
 
 from __future__ import absolute_import, division, print_function
 
+import sys
+
 from setuptools import find_packages, setup
+from setuptools.command.build_py import build_py as _build_py
 
 URL = 'https://github.com/inspirehep/inspire-json-merger'
 
@@ -32,6 +35,7 @@ with open("README.rst") as f:
     readme = f.read()
 
 install_requires = [
+    'futures~=3.0;python_version=="2.7"',
     # newer munkres is Python 3 only
     'munkres==1.0.12',
     'inspire-utils~=3.0,>=3.0.0',
@@ -41,10 +45,15 @@ install_requires = [
 
 docs_require = []
 
+numpy_require = [
+    'numpy>=1.15.0',
+]
+
 tests_require = [
     'decorator~=4.0,>=4.1.2',
     'inspire-schemas==61.5.31',
     'mock~=2.0,>=2.0.0',
+    'numpy>=1.15.0',
     'pytest-cov~=2.0,>=2.5.1',
     'pytest~=4.0,>=4.6.0;python_version <= "2.7"',
     'pytest~=8.0,>=8.0.2;python_version >= "3.6"',
@@ -56,6 +65,7 @@ dev_require = [
 
 extras_require = {
     'docs': docs_require,
+    'numpy': numpy_require,
     'tests': tests_require,
     'dev': dev_require,
 }
@@ -66,6 +76,26 @@ for reqs in extras_require.values():
 
 packages = find_packages(exclude=['docs'])
 
+# ``aio`` needs Python 3.7 on Python 3.
+python_requires = (
+    '>=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, !=3.5.*, !=3.6.*'
+)
+
+
+class build_py(_build_py):
+    """Leave out the asyncio module, which doesn't compile, on Python 2."""
+
+    def find_package_modules(self, package, package_dir):
+        modules = _build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[0] < 3:
+            modules = [
+                (package_, module, filename)
+                for package_, module, filename in modules
+                if (package_, module) != ('inspire_json_merger', 'aio')
+            ]
+        return modules
+
+
 setup(
     name='inspire-json-merger',
     url=URL,
@@ -79,9 +109,16 @@ setup(
     version='11.0.43',
     description=__doc__,
     long_description=readme,
+    python_requires=python_requires,
     install_requires=install_requires,
+    entry_points={
+        'console_scripts': [
+            'inspire-json-merger = inspire_json_merger.cli:main',
+        ],
+    },
     tests_require=tests_require,
     extras_require=extras_require,
+    cmdclass={'build_py': build_py},
     classifiers=[
         'Development Status :: 4 - Beta',
         'Environment :: Web Environment',
@@ -92,7 +129,7 @@ setup(
         'Programming Language :: Python :: 2',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ]
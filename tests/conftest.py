@@ -26,3 +26,6 @@ import os
 import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+
+if sys.version_info[0] < 3:
+    collect_ignore = [os.path.join('unit', 'test_aio.py')]
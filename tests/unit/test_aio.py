@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+import asyncio
+import subprocess
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from inspire_json_merger import api
+from inspire_json_merger.api import merge, merge_async, merge_many_async
+
+ROOT = {'titles': [{'title': 'Superconductivity'}]}
+HEAD = {
+    'titles': [{'title': 'Superconductivity'}],
+    'acquisition_source': {'source': 'arXiv'},
+    'arxiv_eprints': [{'value': '1710.05832'}],
+}
+UPDATE = {
+    'titles': [{'title': 'Superconductivity at high temperature'}],
+    'acquisition_source': {'source': 'arXiv'},
+    'arxiv_eprints': [{'value': '1710.05832'}],
+}
+
+
+async def collect(results):
+    return [result async for result in results]
+
+
+def test_merge_async():
+    result = asyncio.run(merge_async(ROOT, HEAD, UPDATE, head_source='arxiv'))
+
+    assert result == merge(ROOT, HEAD, UPDATE, head_source='arxiv')
+
+
+def test_merge_async_fills_stats():
+    stats = {}
+
+    asyncio.run(merge_async(ROOT, HEAD, UPDATE, stats=stats))
+
+    assert stats['noop_reason'] is None
+    assert 'merge' in stats['durations']
+
+
+def test_merge_async_forwards_the_merge_arguments():
+    references = [{'reference': {'title': {'title': 'A reference'}}}]
+    update = dict(UPDATE, references=references)
+    fingerprints = {}
+    expected_fingerprints = {}
+    expected = merge(
+        ROOT,
+        HEAD,
+        update,
+        fields=['references'],
+        reference_fingerprints=expected_fingerprints,
+    )
+
+    with ProcessPoolExecutor(1) as executor:
+        result = asyncio.run(
+            merge_async(
+                ROOT,
+                HEAD,
+                update,
+                executor=executor,
+                fields=['references'],
+                reference_fingerprints=fingerprints,
+            )
+        )
+
+    assert result == expected
+    assert result[0]['titles'] == HEAD['titles']
+    assert fingerprints == expected_fingerprints
+
+
+def test_aio_can_be_imported_first():
+    code = 'import inspire_json_merger.aio; import inspire_json_merger.api'
+
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+def test_merge_async_timeout(monkeypatch):
+    release = threading.Event()
+
+    def blocking_merge(*args, **kwargs):
+        release.wait()
+
+    monkeypatch.setattr(api, 'merge', blocking_merge)
+
+    executor = ThreadPoolExecutor(1)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(
+                merge_async(ROOT, HEAD, UPDATE, executor=executor, timeout=0.01)
+            )
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_merge_many_async_yields_results_in_input_order():
+    triples = [(ROOT, HEAD, UPDATE), (ROOT, HEAD, None), (ROOT, HEAD, UPDATE, 'arxiv')]
+
+    with ThreadPoolExecutor(2) as executor:
+        results = asyncio.run(
+            collect(merge_many_async(triples, executor=executor, concurrency=2))
+        )
+
+    assert [result.index for result in results] == [0, 1, 2]
+    assert results[0].merged == merge(ROOT, HEAD, UPDATE)[0]
+    assert 'AttributeError' in results[1].error
+    assert results[2].error is None
+
+
+def test_merge_many_async_limits_concurrency(monkeypatch):
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def slow_merge(*args, **kwargs):
+        with lock:
+            running.append(None)
+            max_running.append(len(running))
+        threading.Event().wait(0.01)
+        with lock:
+            running.pop()
+        return {}, []
+
+    monkeypatch.setattr(api, 'merge', slow_merge)
+    triples = [(ROOT, HEAD, UPDATE)] * 10
+
+    with ThreadPoolExecutor(8) as executor:
+        results = asyncio.run(
+            collect(
+                merge_many_async(
+                    triples, executor=executor, concurrency=3, ordered=False
+                )
+            )
+        )
+
+    assert sorted(result.index for result in results) == list(range(10))
+    assert max(max_running) <= 3
+
+
+def test_merge_many_async_cancels_pending_merges_when_cancelled(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_merge(*args, **kwargs):
+        started.set()
+        release.wait()
+        return {}, []
+
+    monkeypatch.setattr(api, 'merge', blocking_merge)
+    triples = [(ROOT, HEAD, UPDATE)] * 10
+
+    async def cancel_while_merging(executor):
+        consumer = asyncio.ensure_future(
+            collect(merge_many_async(triples, executor=executor, concurrency=3))
+        )
+        while not started.is_set():
+            await asyncio.sleep(0.001)
+        merges = asyncio.all_tasks() - {consumer, asyncio.current_task()}
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+        # Check here, as ``asyncio.run`` cancels the tasks left when it ends.
+        await asyncio.wait(merges, timeout=1)
+        return [task.cancelled() for task in merges]
+
+    executor = ThreadPoolExecutor(1)
+    try:
+        cancelled = asyncio.run(cancel_while_merging(executor))
+    finally:
+        release.set()
+        executor.shutdown()
+
+    assert cancelled == [True, True, True]
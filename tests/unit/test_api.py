@@ -22,6 +22,7 @@
 
 from __future__ import absolute_import, division, print_function
 
+import copy
 import json
 import operator
 import os
@@ -30,12 +31,20 @@ from operator import itemgetter
 import pytest
 from utils import assert_ordered_conflicts, validate_subschema
 
+from inspire_json_merger import pre_filters
 from inspire_json_merger.api import (
+    NOOP_MERGES,
+    RecordClassification,
+    classify_records,
     get_acquisition_source,
     get_configuration,
     get_head_source,
+    get_noop_reason,
+    is_erratum,
     merge,
+    merge_many,
 )
+from inspire_json_merger.comparators import AuthorComparator
 from inspire_json_merger.config import (
     ArxivOnArxivOperations,
     ArxivOnPublisherOperations,
@@ -660,3 +669,421 @@ def test_grobid_on_arxiv_operations_keeps_authors_from_head():
     )
     assert not conflicts
     assert merged == expected_merged
+
+
+def test_merge_many_yields_results_in_input_order(arxiv_record):
+    triples = [
+        ({}, arxiv_record, dict(arxiv_record, control_number=number))
+        for number in range(5)
+    ]
+
+    results = list(merge_many(triples, workers=2, chunksize=2))
+
+    assert [result.index for result in results] == list(range(5))
+    for number, result in enumerate(results):
+        assert result.error is None
+        assert result.merged == merge(*triples[number])[0]
+        assert result.conflicts == merge(*triples[number])[1]
+
+
+def test_merge_many_in_completion_order_yields_all_results(arxiv_record):
+    triples = [({}, arxiv_record, arxiv_record, 'arxiv') for _ in range(5)]
+
+    results = list(merge_many(triples, workers=2, ordered=False))
+
+    assert sorted(result.index for result in results) == list(range(5))
+    assert all(result.merged == arxiv_record for result in results)
+
+
+class KillsWorker(object):
+    """Object killing the process that unpickles it, like the OOM killer."""
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_merge_many_survives_dead_worker(arxiv_record, ordered):
+    update = dict(arxiv_record, core=True)
+    triples = [({}, arxiv_record, update)] * 6
+    triples[1] = ({}, arxiv_record, KillsWorker())
+
+    results = list(merge_many(triples, workers=1, ordered=ordered))
+
+    results = sorted(results, key=lambda result: result.index)
+    assert [result.index for result in results] == list(range(6))
+    assert 'BrokenProcessPool' in results[1].error
+    assert results[1].merged is None
+    assert results[-1].error is None
+    assert results[-1].merged == merge({}, arxiv_record, update)[0]
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_merge_many_reports_unpicklable_items(arxiv_record, ordered):
+    triples = [
+        ({}, arxiv_record, arxiv_record),
+        ({}, arxiv_record, {'titles': lambda: None}),
+        ({}, arxiv_record, arxiv_record),
+    ]
+
+    results = list(merge_many(triples, workers=2, ordered=ordered))
+
+    results = sorted(results, key=lambda result: result.index)
+    assert [result.error is None for result in results] == [True, False, True]
+    assert 'pickle' in results[1].error.lower()
+
+
+def test_merge_many_reports_failures_without_stopping(arxiv_record):
+    triples = [
+        ({}, arxiv_record, arxiv_record),
+        ({}, arxiv_record, None),
+        ({}, arxiv_record, arxiv_record),
+    ]
+
+    results = list(merge_many(triples, workers=2))
+
+    assert [result.error is None for result in results] == [True, False, True]
+    assert results[1].merged is None
+    assert results[1].conflicts is None
+    assert 'AttributeError' in results[1].error
+    assert results[2].merged == arxiv_record
+
+
+def test_get_noop_reason(arxiv_record, publisher_record):
+    assert get_noop_reason(publisher_record, dict(publisher_record)) == (
+        'update_equals_head'
+    )
+    assert get_noop_reason(publisher_record, arxiv_record) is None
+
+
+def test_merge_runs_the_merger_when_update_equals_root(erratum_1, publisher_record):
+    # The pre-filters of an erratum drop the root and mark the update DOIs
+    # as erratum ones, so the update still brings changes.
+    root = erratum_1
+    head = dict(publisher_record, titles=[{'title': 'Superconductivity'}])
+    update = dict(erratum_1)
+    NOOP_MERGES.clear()
+
+    merged, conflicts = merge(root, head, update)
+
+    assert merged['dois'] == [
+        {'value': '10.1023/A:1026654312961'},
+        {'value': '10.1023/A:1026654312961', 'material': 'erratum'},
+    ]
+    assert conflicts == []
+    assert NOOP_MERGES == {}
+
+
+def test_merge_returns_head_when_update_equals_head(arxiv_record):
+    head = dict(arxiv_record, titles=[{'title': 'Curated title'}])
+    update = dict(head)
+    count = NOOP_MERGES['update_equals_head']
+
+    merged, conflicts = merge(arxiv_record, head, update)
+
+    assert merged == head
+    assert conflicts == []
+    assert NOOP_MERGES['update_equals_head'] == count + 1
+
+
+def test_merge_does_not_report_conflicts_on_unchanged_duplicate_authors():
+    # head.json has several authors with the same name, which the merger
+    # can't match unambiguously when they go through the list merge.
+    authors = load_test_data('test_data/head.json')['authors']
+    record = {
+        '_collections': ['Literature'],
+        'acquisition_source': {'source': 'arXiv'},
+        'arxiv_eprints': [{'value': '1710.05832'}],
+        'authors': authors,
+        'document_type': ['article'],
+        'titles': [{'title': 'A title'}],
+    }
+    update = dict(record, core=True)
+
+    merged, conflicts = merge(record, record, update)
+
+    assert merged['authors'] == authors
+    assert merged['core'] is True
+    assert conflicts == []
+    validate_subschema(merged)
+
+
+def test_merge_fills_stats(arxiv_record):
+    head = dict(arxiv_record, authors=[{'full_name': 'Smith, J.'}])
+    update = dict(
+        arxiv_record,
+        authors=[{'full_name': 'Smith, J.'}, {'full_name': 'Doe, J.'}],
+        references=[{'reference': {'title': {'title': 'A reference'}}}],
+    )
+    stats = {}
+
+    merge({}, head, update, stats=stats)
+
+    assert stats['noop_reason'] is None
+    assert stats['degraded_reason'] is None
+    assert stats['sizes'] == {
+        'root': {'authors': 0, 'references': 0, 'documents': 0, 'figures': 0},
+        'head': {'authors': 1, 'references': 0, 'documents': 0, 'figures': 0},
+        'update': {'authors': 2, 'references': 1, 'documents': 0, 'figures': 0},
+    }
+    assert set(stats['durations']) == {
+        'total',
+        'get_noop_reason',
+        'get_configuration',
+        'filter_records',
+        'split_unchanged_fields',
+        'merge',
+        'filter_conflicts',
+        'postprocess_results',
+    }
+    assert all(duration >= 0 for duration in stats['durations'].values())
+    assert stats['durations']['total'] >= stats['durations']['merge']
+
+
+def test_merge_fills_stats_when_authors_are_matched_by_position(
+    monkeypatch, arxiv_record
+):
+    monkeypatch.setattr(AuthorComparator, 'max_distance_pairs', 0)
+    head = dict(arxiv_record, authors=[{'full_name': 'Kowalski, Maria'}])
+    update = dict(
+        arxiv_record,
+        authors=[{'full_name': 'Kowalsky, Maria'}, {'full_name': 'Doe, J.'}],
+    )
+    stats = {}
+
+    merged, _ = merge({}, head, update, stats=stats)
+
+    assert stats['degraded_reason'] == 'max_pairs'
+    assert [author['full_name'] for author in merged['authors']] == [
+        'Kowalski, Maria',
+        'Doe, J.',
+    ]
+
+
+def test_merge_reuses_the_reference_fingerprints(monkeypatch, arxiv_record):
+    references = [
+        {'reference': {'title': {'title': 'Reference %d' % index}}}
+        for index in range(5)
+    ]
+    root = dict(arxiv_record, references=references[:2])
+    update = dict(arxiv_record, references=references[:3])
+    fingerprints = {}
+
+    head, _ = merge(root, root, update, reference_fingerprints=fingerprints)
+
+    expected = pre_filters.get_reference_fingerprints(references[:3])
+    digest = pre_filters.get_references_digest(references[:3])
+    assert fingerprints == {
+        'root': expected,
+        'root_digest': digest,
+        'head': expected,
+        'head_digest': digest,
+    }
+
+    fingerprinted = []
+
+    def get_reference_fingerprint(reference):
+        fingerprinted.append(reference)
+        return get_fingerprint(reference)
+
+    get_fingerprint = pre_filters.get_reference_fingerprint
+    monkeypatch.setattr(
+        pre_filters, 'get_reference_fingerprint', get_reference_fingerprint
+    )
+    new_update = dict(arxiv_record, references=references)
+
+    merged, _ = merge(update, head, new_update, reference_fingerprints=fingerprints)
+
+    assert merged['references'] == references
+    assert fingerprinted == references
+    expected = pre_filters.get_reference_fingerprints(references)
+    digest = pre_filters.get_references_digest(references)
+    assert fingerprints == {
+        'root': expected,
+        'root_digest': digest,
+        'head': expected,
+        'head_digest': digest,
+    }
+
+
+def test_merge_keeps_the_reference_fingerprints_of_curated_head(arxiv_record):
+    references = [
+        {'reference': {'title': {'title': 'Reference %d' % index}}}
+        for index in range(3)
+    ]
+    root = dict(arxiv_record, references=references[:2])
+    head = dict(arxiv_record, references=references[1:])
+    update = dict(arxiv_record, references=references[:1])
+    fingerprints = {
+        'head': pre_filters.get_reference_fingerprints(references[1:]),
+        'head_digest': pre_filters.get_references_digest(references[1:]),
+    }
+
+    merged, _ = merge(root, head, update, reference_fingerprints=fingerprints)
+
+    assert merged['references'] == references[1:]
+    assert fingerprints == {
+        'root': pre_filters.get_reference_fingerprints(references[:1]),
+        'root_digest': pre_filters.get_references_digest(references[:1]),
+        'head': pre_filters.get_reference_fingerprints(references[1:]),
+        'head_digest': pre_filters.get_references_digest(references[1:]),
+    }
+
+
+def test_merge_ignores_the_reference_fingerprints_of_edited_references(
+    arxiv_record,
+):
+    references = [
+        {'reference': {'title': {'title': 'Reference %d' % index}}}
+        for index in range(2)
+    ]
+    update = dict(arxiv_record, references=references)
+    fingerprints = {}
+
+    head, _ = merge({}, arxiv_record, update, reference_fingerprints=fingerprints)
+    # A curator fixes a reference in place, keeping the number of references.
+    head['references'][0]['reference']['title']['title'] = 'Curated reference'
+    curated_references = copy.deepcopy(head['references'])
+    new_update = dict(
+        arxiv_record,
+        references=[{'reference': {'title': {'title': 'New reference'}}}] * 2,
+    )
+
+    merged, _ = merge(update, head, new_update, reference_fingerprints=fingerprints)
+
+    assert merged['references'] == curated_references
+
+
+def test_merge_fills_stats_on_noop(arxiv_record):
+    stats = {}
+
+    merge({}, arxiv_record, arxiv_record, stats=stats)
+
+    assert stats['noop_reason'] == 'update_equals_head'
+    assert set(stats['durations']) == {
+        'total',
+        'get_configuration',
+        'filter_records',
+        'get_noop_reason',
+    }
+
+
+def test_merge_with_fields_only_merges_those_fields():
+    root = {}
+    head = {
+        'titles': [{'title': 'Head title'}],
+        'authors': [
+            {'full_name': 'Sułkowski, Piotr', 'emails': ['sulkowski.p@fuw.edu.pl']}
+        ],
+    }
+    update = {
+        'titles': [{'title': 'Update title'}],
+        'authors': [
+            {
+                'full_name': 'Sułkowski, Piotr',
+                'raw_affiliations': [{'value': 'Warsaw U.'}],
+            }
+        ],
+    }
+
+    merged, conflicts = merge(
+        root,
+        head,
+        update,
+        configuration=GrobidOnArxivAuthorsOperations,
+        fields=['authors'],
+    )
+
+    assert conflicts == []
+    assert merged['titles'] is head['titles']
+    assert merged['authors'] == [
+        {
+            'full_name': 'Sułkowski, Piotr',
+            'emails': ['sulkowski.p@fuw.edu.pl'],
+            'raw_affiliations': [{'value': 'Warsaw U.'}],
+        }
+    ]
+    assert '__pos' not in head['authors'][0]
+
+
+def test_merge_with_fields_gives_the_same_fields_as_full_merge():
+    root = load_test_data('test_data/root.json')
+    head = load_test_data('test_data/head.json')
+    update = load_test_data('test_data/update.json')
+    expected_merged, expected_conflicts = merge(root, head, update)
+
+    merged, conflicts = merge(root, head, update, fields=['authors', 'dois'])
+
+    assert merged['authors'] == expected_merged['authors']
+    assert merged.get('dois') == expected_merged.get('dois')
+    assert conflicts == [
+        conflict
+        for conflict in expected_conflicts
+        if conflict['path'].split('/')[1] in ('authors', 'dois')
+    ]
+    assert {
+        key: value
+        for key, value in merged.items()
+        if key not in ('authors', 'dois')
+    } == {key: value for key, value in head.items() if key not in ('authors', 'dois')}
+
+
+def test_merge_with_fields_is_noop_when_fields_are_unchanged(arxiv_record):
+    NOOP_MERGES.clear()
+    update = dict(arxiv_record, core=True)
+
+    merged, conflicts = merge({}, arxiv_record, update, fields=['arxiv_eprints'])
+
+    assert merged == arxiv_record
+    assert merged['arxiv_eprints'] is not arxiv_record['arxiv_eprints']
+    assert conflicts == []
+    assert NOOP_MERGES == {'update_equals_head': 1}
+
+
+def test_classify_records(arxiv_record, publisher_record, erratum_1):
+    assert classify_records(arxiv_record, erratum_1) == RecordClassification(
+        head_source='arxiv', update_source='ejl', manual_merge=False, erratum=True
+    )
+    assert classify_records(
+        dict(publisher_record, control_number=1),
+        dict(arxiv_record, control_number=2),
+        head_source='arxiv',
+    ) == RecordClassification(
+        head_source='arxiv', update_source='arxiv', manual_merge=True, erratum=False
+    )
+
+
+def test_get_configuration_reuses_classification(arxiv_record, publisher_record):
+    classification = RecordClassification(
+        head_source='arxiv', update_source=None, manual_merge=False, erratum=True
+    )
+
+    assert (
+        get_configuration(arxiv_record, arxiv_record, classification=classification)
+        == ErratumOnPublisherOperations
+    )
+
+
+@pytest.mark.parametrize(
+    ('update', 'expected'),
+    [
+        ({'titles': [{'title': 'Publisher Correction: a title'}]}, True),
+        ({'titles': [{'title': "Publisher's note"}]}, True),
+        ({'titles': [{'title': 'A title'}, {'title': 'correction to: A'}]}, True),
+        ({'titles': [{'title': 'A correction to: a title'}]}, False),
+        ({'titles': [{'source': 'arXiv'}]}, False),
+        ({'dois': [{'value': '10.1/a', 'material': 'erratum'}]}, True),
+        ({'dois': [{'value': '10.1/a'}]}, False),
+        ({}, False),
+    ],
+)
+def test_is_erratum(update, expected):
+    assert is_erratum(update) is expected
+
+
+def test_merge_fills_stats_with_classification(arxiv_record, publisher_record):
+    stats = {}
+
+    merge({}, arxiv_record, publisher_record, stats=stats)
+
+    assert stats['classification'] == classify_records(arxiv_record, publisher_record)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from inspire_json_merger import api
+from inspire_json_merger.api import merge
+from inspire_json_merger.cli import main
+
+ROOT = {'titles': [{'title': 'Superconductivity'}]}
+HEAD = {
+    'titles': [{'title': 'Superconductivity'}],
+    'acquisition_source': {'source': 'arXiv'},
+    'arxiv_eprints': [{'value': '1710.05832'}],
+}
+UPDATE = {
+    'titles': [{'title': 'Superconductivity at high temperature'}],
+    'acquisition_source': {'source': 'arXiv'},
+    'arxiv_eprints': [{'value': '1710.05832'}],
+}
+
+
+def run_cli(tmpdir, lines, *args):
+    input_file = tmpdir.join('input.jsonl')
+    input_file.write('\n'.join(lines) + '\n')
+    output_file = tmpdir.join('output.jsonl')
+
+    status = main([str(input_file), '-o', str(output_file), '-w', '2'] + list(args))
+
+    return status, [json.loads(line) for line in output_file.readlines()]
+
+
+def test_cli_merges_objects_and_arrays(tmpdir):
+    lines = [
+        json.dumps({'root': ROOT, 'head': HEAD, 'update': UPDATE}),
+        json.dumps([ROOT, HEAD, UPDATE, 'arxiv']),
+    ]
+    expected_merged, expected_conflicts = merge(ROOT, HEAD, UPDATE)
+
+    status, output = run_cli(tmpdir, lines)
+
+    assert status == 0
+    assert [result['line'] for result in output] == [1, 2]
+    for result in output:
+        assert result['merged'] == expected_merged
+        assert result['conflicts'] == expected_conflicts
+
+
+def test_cli_reports_failures_and_keeps_going(tmpdir, capsys):
+    lines = [
+        'not json',
+        json.dumps([ROOT, HEAD, None]),
+        '',
+        json.dumps([ROOT, HEAD, UPDATE]),
+    ]
+
+    status, output = run_cli(tmpdir, lines, '--unordered')
+
+    assert status == 1
+    output = sorted(output, key=lambda result: result['line'])
+    assert [result['line'] for result in output] == [2, 4]
+    assert 'error' in output[0]
+    assert 'merged' in output[1]
+    assert 'line 1: invalid triple' in capsys.readouterr().err
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != 'fork',
+    reason='the patched merge has to be inherited by the workers',
+)
+@pytest.mark.parametrize('ordering', [[], ['--unordered']])
+def test_cli_survives_dead_worker(tmpdir, monkeypatch, ordering):
+    def merge_or_die(root, head, update, *args, **kwargs):
+        if update.get('die'):
+            os._exit(1)
+        return merge(root, head, update, *args, **kwargs)
+
+    monkeypatch.setattr(api, 'merge', merge_or_die)
+    lines = [json.dumps([ROOT, HEAD, UPDATE])] * 6
+    lines[1] = json.dumps([ROOT, HEAD, dict(UPDATE, die=True)])
+
+    status, output = run_cli(tmpdir, lines, '-w', '1', *ordering)
+
+    assert status == 1
+    output = sorted(output, key=lambda result: result['line'])
+    assert [result['line'] for result in output] == [1, 2, 3, 4, 5, 6]
+    assert 'BrokenProcessPool' in output[1]['error']
+    assert 'merged' in output[-1]
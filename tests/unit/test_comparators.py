@@ -22,12 +22,14 @@
 
 from __future__ import absolute_import, division, print_function
 
+import pytest
 from inspire_schemas.api import load_schema, validate
 from json_merger.config import UnifierOps
+from json_merger.contrib.inspirehep.author_util import NameInitial
 from utils import assert_ordered_conflicts
 
 from inspire_json_merger.api import merge
-from inspire_json_merger.comparators import IDNormalizer
+from inspire_json_merger.comparators import IDNormalizer, author_tokenize
 from inspire_json_merger.config import ArxivOnArxivOperations
 
 ArxivOnArxivOperations.list_merge_ops[
@@ -74,6 +76,36 @@ def test_id_normalizer():
     assert normalizer(author) == 'J.Smith.1'
 
 
+def test_author_tokenize_caches_the_tokens():
+    cache = author_tokenize.cache
+    cache.clear()
+
+    tokens = author_tokenize('Smith, John R.')
+    assert author_tokenize('Smith, John R.') is tokens
+    assert [token.token for token in tokens['lastnames']] == ['smith']
+    assert [token.token for token in tokens['nonlastnames']] == ['john', 'r']
+    assert cache.info()[:2] == (1, 1)
+
+    with pytest.raises(TypeError):
+        tokens['lastnames'] = ()
+    with pytest.raises(AttributeError):
+        tokens['nonlastnames'].append(tokens['lastnames'][0])
+    with pytest.raises(KeyError):
+        tokens['titles']
+
+
+def test_author_tokenize_shares_the_tokens():
+    author_tokenize.cache.clear()
+
+    tokens1 = author_tokenize('Smith, John R.')
+    tokens2 = author_tokenize('Smith-Jones, J. John')
+
+    assert tokens2.nonlastnames[1] is tokens1.nonlastnames[0]
+    assert isinstance(tokens1.nonlastnames[1], NameInitial)
+    assert tokens2.nonlastnames[0] is not tokens1.nonlastnames[1]
+    assert author_tokenize('SMITH, JOHN').lastnames[0] is tokens1.lastnames[0]
+
+
 def test_comparing_authors_unicode_name():
     root = {}
     head = {
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import random
+
+import pytest
+from test_matching import random_authors
+
+from inspire_json_merger import distances
+from inspire_json_merger.comparators import AuthorComparator
+from inspire_json_merger.distances import get_distances
+from inspire_json_merger.matching import match_authors
+
+pytest.importorskip('numpy')
+
+SPECIAL_NAMES = [
+    {'full_name': 'Smith, J. K. L. M. N. O. P.'},
+    {'full_name': 'Smith, J. K. L. M.'},
+    {'full_name': 'Xavier, J. K.'},
+    {'full_name': 'J, S'},
+    {'full_name': 'J.'},
+    {'full_name': ''},
+    {'full_name': 'Jean-Pierre, Dupont'},
+    {'full_name': 'Dupont, Jean Pierre'},
+    {'full_name': 'Żółć, Gęślą'},
+    {'ids': [{'schema': 'ORCID', 'value': '0000-0002-0000-0000'}]},
+]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_get_distances_with_numpy_is_the_same_as_the_distance_function(seed):
+    rng = random.Random(seed)
+    authors1 = random_authors(rng, 50) + SPECIAL_NAMES
+    authors2 = random_authors(rng, 50) + SPECIAL_NAMES
+    pairs = [(i1, i2) for i1 in range(len(authors1)) for i2 in range(len(authors2))]
+    distance = AuthorComparator.distance_function
+
+    result = get_distances(authors1, authors2, pairs, distance, min_pairs=0)
+
+    assert result == [distance(authors1[i1], authors2[i2]) for i1, i2 in pairs]
+    assert all(type(value) is float for value in result)
+
+
+def test_get_distances_uses_the_distance_function_on_few_pairs(monkeypatch):
+    def _get_batch_distances(*args):
+        raise AssertionError('NumPy used on few pairs')
+
+    monkeypatch.setattr(distances, '_get_batch_distances', _get_batch_distances)
+    authors = [{'full_name': 'Smith, J.'}, {'full_name': 'Smith, John'}]
+
+    result = get_distances(
+        authors, authors, [(0, 1)], AuthorComparator.distance_function, min_pairs=2
+    )
+
+    assert result == [0.025]
+
+
+def test_get_distances_only_uses_numpy_for_author_name_distances():
+    authors = [{'full_name': 'Smith, J.'}]
+
+    result = get_distances(
+        authors, authors, [(0, 0)], lambda a1, a2: 0.5, min_pairs=0
+    )
+
+    assert result == [0.5]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_match_authors_with_numpy_is_the_same(monkeypatch, seed):
+    rng = random.Random(seed)
+    l1 = random_authors(rng, 40)
+    l2 = random_authors(rng, 40)
+    args = (
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        AuthorComparator.norm_functions,
+        AuthorComparator.id_types,
+    )
+    expected = match_authors(*args)
+
+    monkeypatch.setattr(distances, 'NUMPY_MIN_PAIRS', 0)
+
+    assert sorted(match_authors(*args)) == sorted(expected)
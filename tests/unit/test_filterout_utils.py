@@ -22,13 +22,19 @@
 
 from __future__ import absolute_import, division, print_function
 
+import random
+
 from json_merger.conflict import Conflict
 
 from inspire_json_merger.utils import (
+    CacheInfo,
+    ConflictFilter,
+    LRUCache,
     conflict_to_list,
     filter_conflicts,
     filter_conflicts_by_path,
     is_to_delete,
+    split_unchanged_fields,
 )
 
 
@@ -145,3 +151,111 @@ def test_filter_conflicts():
     ]
     fields = ['authors.affiliations', 'authors.full_name', 'report_numbers']
     assert len(filter_conflicts(conflicts, fields)) == 4
+
+
+def test_conflict_filter_keeps_the_shortest_paths():
+    conflict_filter = ConflictFilter(
+        ['authors.affiliations.value', 'authors.affiliations', 'figures', 'figures.key']
+    )
+
+    assert conflict_filter.is_filtered(
+        ('SET_FIELD', ('authors', 0, 'affiliations', 1, 'record'), 'CERN')
+    )
+    assert conflict_filter.is_filtered(('SET_FIELD', ('figures',), []))
+    assert not conflict_filter.is_filtered(
+        ('SET_FIELD', ('authors', 0, 'full_name'), 'Smith, J.')
+    )
+    assert not conflict_filter.is_filtered(('SET_FIELD', ('authors',), []))
+    assert not conflict_filter.is_filtered(('MANUAL_MERGE', ('figures',), []))
+
+
+def test_conflict_filter_is_the_same_as_filtering_every_path():
+    rng = random.Random(0)
+    keys = ['authors', 'affiliations', 'value', 'figures', 'key', 'source', 0, 1]
+    conflicts = [
+        (
+            rng.choice(['SET_FIELD', 'ADD_BACK_TO_HEAD', 'MANUAL_MERGE']),
+            tuple(rng.choice(keys) for _ in range(rng.randint(1, 5))),
+            None,
+        )
+        for _ in range(500)
+    ]
+    string_keys = [key for key in keys if not isinstance(key, int)]
+    fields = [
+        '.'.join(rng.choice(string_keys) for _ in range(rng.randint(1, 3)))
+        for _ in range(8)
+    ]
+
+    expected = conflicts
+    for field in fields:
+        expected = filter_conflicts_by_path(expected, field)
+
+    assert ConflictFilter(fields)(conflicts) == expected
+    assert filter_conflicts(conflicts, fields) == expected
+
+
+def test_split_unchanged_fields_resolves_fields_equal_everywhere():
+    authors = [{'full_name': 'Smith, J.'}]
+    root = {'authors': authors, 'titles': [{'title': 'Root'}]}
+    head = {'authors': [dict(authors[0])], 'titles': [{'title': 'Head'}]}
+    update = {'authors': authors, 'titles': [{'title': 'Update'}]}
+
+    resolved, root, head, update = split_unchanged_fields(root, head, update)
+
+    assert resolved == {'authors': [{'full_name': 'Smith, J.'}]}
+    assert root == {'titles': [{'title': 'Root'}]}
+    assert head == {'titles': [{'title': 'Head'}]}
+    assert update == {'titles': [{'title': 'Update'}]}
+
+
+def test_split_unchanged_fields_resolves_single_sided_changes_without_lists():
+    root = {'core': False, 'citeable': True, 'number_of_pages': 3}
+    head = {'core': True, 'citeable': True, 'number_of_pages': 3}
+    update = {'core': False, 'number_of_pages': 4}
+
+    resolved, root, head, update = split_unchanged_fields(root, head, update)
+
+    assert resolved == {'core': True, 'number_of_pages': 4}
+    assert root == head == update == {}
+
+
+def test_split_unchanged_fields_keeps_lists_and_double_sided_changes():
+    root = {'core': False, 'keywords': [{'value': 'a'}]}
+    head = {'core': True, 'keywords': [{'value': 'a'}, {'value': 'b'}]}
+    update = {'core': None, 'keywords': [{'value': 'a'}]}
+
+    resolved, root, head, update = split_unchanged_fields(root, head, update)
+
+    assert resolved == {}
+    assert root == {'core': False, 'keywords': [{'value': 'a'}]}
+    assert head == {'core': True, 'keywords': [{'value': 'a'}, {'value': 'b'}]}
+    assert update == {'core': None, 'keywords': [{'value': 'a'}]}
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+
+    assert cache.get('a', str.upper) == 'A'
+    assert cache.get('b', str.upper) == 'B'
+    assert cache.get('a', str.lower) == 'A'
+    assert cache.get('c', str.upper) == 'C'
+    assert cache.get('b', str.lower) == 'b'
+
+    assert cache.info() == CacheInfo(hits=1, misses=4, maxsize=2, currsize=2)
+
+
+def test_lru_cache_resize_and_clear():
+    cache = LRUCache(3)
+    for key in 'abc':
+        cache.get(key, str.upper)
+
+    cache.resize(1)
+    assert cache.info() == CacheInfo(hits=0, misses=3, maxsize=1, currsize=1)
+    assert cache.get('c', str.lower) == 'C'
+
+    cache.resize(0)
+    assert cache.get('c', str.lower) == 'c'
+    assert cache.info().currsize == 0
+
+    cache.clear()
+    assert cache.info() == CacheInfo(hits=0, misses=0, maxsize=0, currsize=0)
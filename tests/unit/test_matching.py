@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from json_merger.comparator import BaseComparator
+from json_merger.contrib.inspirehep.match import distance_function_match
+
+from inspire_json_merger import matching
+from inspire_json_merger.comparators import AuthorComparator, IDNormalizer
+from inspire_json_merger.matching import (
+    AuthorKeys,
+    get_candidate_pairs,
+    match_authors,
+)
+
+LAST_NAMES = [
+    'Smith',
+    'Smyth',
+    'Schmidt',
+    'Kowalski',
+    'Kowalsky',
+    'Müller',
+    'Mueller',
+    'Papadopoulos',
+    'Papadopoulou',
+    'Vanderbiltschmidt',
+    'Vanderbildschmitt',
+    'Ellis',
+    'Li',
+    'Lee',
+]
+FIRST_NAMES = ['John', 'Jon', 'Jane', 'J.', 'Maria', 'M.', 'Marie', 'A. B.', 'Ab']
+
+
+def random_author(rng):
+    author = {
+        'full_name': '%s, %s' % (rng.choice(LAST_NAMES), rng.choice(FIRST_NAMES))
+    }
+    if rng.random() < 0.2:
+        bai = 'J.Smith.%d' % rng.randint(1, 3)
+        author['ids'] = [{'schema': 'INSPIRE BAI', 'value': bai}]
+    if rng.random() < 0.2:
+        orcid = '0000-0002-%04d-0000' % rng.randint(1, 3)
+        author.setdefault('ids', []).insert(0, {'schema': 'ORCID', 'value': orcid})
+    if rng.random() < 0.05:
+        del author['full_name']
+    return author
+
+
+def random_authors(rng, size):
+    authors = [random_author(rng) for _ in range(size)]
+    # Add some exact duplicates, which make the normalization ambiguous.
+    authors.extend(rng.sample(authors, size // 10))
+    rng.shuffle(authors)
+    return authors
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_match_authors_is_the_same_as_distance_function_match(seed):
+    rng = random.Random(seed)
+    l1 = random_authors(rng, rng.randint(0, 40))
+    l2 = random_authors(rng, rng.randint(0, 40))
+
+    expected = distance_function_match(
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        [IDNormalizer(id_type) for id_type in AuthorComparator.id_types]
+        + AuthorComparator.norm_functions,
+    )
+    result = match_authors(
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        AuthorComparator.norm_functions,
+        AuthorComparator.id_types,
+    )
+
+    assert sorted(result) == sorted(expected)
+
+
+def test_match_authors_matches_identifiers_first():
+    l1 = [
+        {'full_name': 'Smith, J.', 'ids': [{'schema': 'ORCID', 'value': 'a'}]},
+        {'full_name': 'Smith, J.', 'ids': [{'schema': 'ORCID', 'value': 'b'}]},
+        {'full_name': 'Smith, John', 'ids': [{'schema': 'INSPIRE BAI', 'value': 'c'}]},
+    ]
+    l2 = [
+        {'full_name': 'Smith, John', 'ids': [{'schema': 'INSPIRE BAI', 'value': 'c'}]},
+        {'full_name': 'Smith, J.', 'ids': [{'schema': 'ORCID', 'value': 'b'}]},
+        {'full_name': 'Smith, J.', 'ids': [{'schema': 'ORCID', 'value': 'a'}]},
+    ]
+
+    result = match_authors(
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        id_types=AuthorComparator.id_types,
+    )
+
+    assert sorted(result) == [(0, 2), (1, 1), (2, 0)]
+
+
+def test_match_authors_checks_the_distance_of_identifier_matches():
+    l1 = [{'full_name': 'Smith, J.', 'ids': [{'schema': 'ORCID', 'value': 'a'}]}]
+    l2 = [{'full_name': 'Ellis, J.', 'ids': [{'schema': 'ORCID', 'value': 'a'}]}]
+
+    result = match_authors(
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        id_types=AuthorComparator.id_types,
+    )
+
+    assert result == []
+
+
+def test_match_authors_looks_up_the_author_keys():
+    rng = random.Random(0)
+    l1 = random_authors(rng, 30)
+    l2 = random_authors(rng, 30)
+    author_keys = AuthorKeys(AuthorComparator.id_types, AuthorComparator.norm_functions)
+    author_keys.add(l1)
+    author_keys.add(l2)
+    computed = len(author_keys)
+    args = (
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        AuthorComparator.norm_functions,
+        AuthorComparator.id_types,
+    )
+
+    result = match_authors(*args, author_keys=author_keys)
+
+    assert sorted(result) == sorted(match_authors(*args))
+    assert len(author_keys) == computed
+
+
+def test_author_keys_only_depend_on_name_and_ids():
+    author_keys = AuthorKeys(['ORCID'], [lambda author: author['full_name'].upper()])
+    author = {
+        'full_name': 'Smith, J.',
+        'ids': [
+            {'schema': 'INSPIRE BAI', 'value': 'J.Smith.1'},
+            {'schema': 'ORCID', 'value': 'a'},
+            {'schema': 'ORCID', 'value': 'b'},
+        ],
+    }
+
+    keys = author_keys.get(author)
+
+    assert keys == ({'ORCID': 'a'}, ('SMITH, J.',))
+    assert author_keys.get(dict(author, affiliations=[{'value': 'CERN'}])) is keys
+    assert author_keys.get({'full_name': 'Smith, J.'}) == ({}, ('SMITH, J.',))
+    assert len(author_keys) == 2
+
+
+@pytest.mark.parametrize('threshold', [0.05, 0.12, 0.3])
+def test_get_candidate_pairs_keeps_all_close_pairs(threshold):
+    rng = random.Random(0)
+    authors1 = random_authors(rng, 60)
+    authors2 = random_authors(rng, 60)
+    distance = AuthorComparator.distance_function
+
+    candidates = get_candidate_pairs(authors1, authors2, threshold, distance)
+
+    assert candidates == sorted(candidates)
+    assert len(candidates) < len(authors1) * len(authors2)
+    assert set(candidates) >= {
+        (i1, i2)
+        for i1, author1 in enumerate(authors1)
+        for i2, author2 in enumerate(authors2)
+        if distance(author1, author2) <= threshold
+    }
+
+
+def test_get_candidate_pairs_matches_long_names_with_typos():
+    authors1 = [{'full_name': 'Vanderbiltschmidtberg, A.'}]
+    authors2 = [{'full_name': 'Vanderbildschmittberg, A.'}, {'full_name': 'Smith, B.'}]
+    distance = AuthorComparator.distance_function
+
+    assert distance(authors1[0], authors2[0]) <= AuthorComparator.threshold
+    assert get_candidate_pairs(authors1, authors2, 0.12, distance) == [(0, 0)]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_match_authors_greedily_only_matches_close_authors(seed):
+    rng = random.Random(seed)
+    l1 = random_authors(rng, 40)
+    l2 = random_authors(rng, 40)
+    distance = AuthorComparator.distance_function
+
+    result = match_authors(
+        l1, l2, AuthorComparator.threshold, distance, max_munkres_size=0
+    )
+
+    assert result
+    for i1, i2 in result:
+        assert distance(l1[i1], l2[i2]) <= AuthorComparator.threshold
+
+
+def test_match_authors_greedily_is_the_same_as_munkres_on_clear_cases():
+    l1 = [
+        {'full_name': 'Smith, J.'},
+        {'full_name': 'Kowalski, Maria'},
+        {'full_name': 'Ellis, J.'},
+        {'full_name': 'Ellis, J.'},
+    ]
+    l2 = [
+        {'full_name': 'Ellis, J.'},
+        {'full_name': 'Kowalsky, Maria'},
+        {'full_name': 'Smith, John'},
+    ]
+    args = (l1, l2, AuthorComparator.threshold, AuthorComparator.distance_function)
+
+    expected = match_authors(*args)
+    result = match_authors(*args, max_munkres_size=0)
+
+    assert sorted(result) == sorted(expected) == [(0, 2), (1, 1), (2, 0), (3, 0)]
+
+
+def test_match_authors_does_not_use_munkres_on_huge_components(monkeypatch):
+    def _match_munkres(*args):
+        raise AssertionError('Munkres used on a huge component')
+
+    monkeypatch.setattr(matching, '_match_munkres', _match_munkres)
+    l1 = [{'full_name': 'Wang, Y.'}] * 150
+    l2 = [{'full_name': 'Wang, Yi'}] * 50 + [{'full_name': 'Wang, Y.'}] * 150
+
+    result = match_authors(
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        max_munkres_size=100,
+    )
+
+    assert {i2 for _, i2 in result} == set(range(50, 200))
+
+
+@pytest.mark.parametrize('executor_class', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_match_authors_with_an_executor_is_the_same(monkeypatch, executor_class):
+    monkeypatch.setattr(matching, 'PARALLEL_CHUNK_PAIRS', 50)
+    rng = random.Random(0)
+    l1 = random_authors(rng, 60)
+    l2 = random_authors(rng, 60)
+    args = (
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        AuthorComparator.norm_functions,
+        AuthorComparator.id_types,
+    )
+    expected = match_authors(*args)
+
+    with executor_class(2) as executor:
+        result = match_authors(*args, executor=executor, parallel_min_authors=0)
+        assert result == expected
+        assert match_authors(*args, max_munkres_size=0) == match_authors(
+            *args, max_munkres_size=0, executor=executor, parallel_min_authors=0
+        )
+
+
+def test_match_authors_does_not_use_the_executor_on_small_lists():
+    class Executor(object):
+        def submit(self, *args):
+            raise AssertionError('executor used on small lists')
+
+    l1 = [{'full_name': 'Smith, John'}, {'full_name': 'Kowalski, Maria'}]
+    l2 = [{'full_name': 'Kowalsky, Maria'}, {'full_name': 'Smith, John'}]
+
+    result = match_authors(
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        executor=Executor(),
+        parallel_min_authors=3,
+    )
+
+    assert sorted(result) == [(0, 1), (1, 0)]
+
+
+DEGRADED_L1 = [
+    {'full_name': 'Kowalski, Maria'},
+    {'full_name': 'Smith, J.', 'ids': [{'schema': 'ORCID', 'value': 'a'}]},
+    {'full_name': 'Papadopoulos, Jane'},
+    {'full_name': 'Ellis, J.'},
+]
+DEGRADED_L2 = [
+    {'full_name': 'Kowalsky, Maria'},
+    {'full_name': 'Papadopoulou, Jane'},
+    {'full_name': 'Smith, J.', 'ids': [{'schema': 'ORCID', 'value': 'a'}]},
+    {'full_name': 'Doe, J.'},
+]
+
+
+def test_match_authors_by_position_beyond_max_pairs():
+    args = (
+        DEGRADED_L1,
+        DEGRADED_L2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        AuthorComparator.norm_functions,
+        AuthorComparator.id_types,
+    )
+    stats = {}
+
+    result = match_authors(*args, max_pairs=0, stats=stats)
+
+    assert sorted(result) == [(0, 0), (1, 2), (2, 1)]
+    assert stats == {'degraded_reason': 'max_pairs'}
+
+
+def test_match_authors_by_position_misses_moved_authors():
+    l1 = [{'full_name': 'Kowalski, Maria'}, {'full_name': 'Papadopoulos, Jane'}]
+    l2 = [{'full_name': 'Papadopoulou, Jane'}, {'full_name': 'Kowalsky, Maria'}]
+    args = (l1, l2, AuthorComparator.threshold, AuthorComparator.distance_function)
+
+    assert sorted(match_authors(*args)) == [(0, 1), (1, 0)]
+    assert match_authors(*args, max_pairs=0) == []
+
+
+def test_match_authors_by_position_after_timeout():
+    stats = {}
+
+    result = match_authors(
+        DEGRADED_L1,
+        DEGRADED_L2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        AuthorComparator.norm_functions,
+        AuthorComparator.id_types,
+        timeout=0,
+        stats=stats,
+    )
+
+    assert sorted(result) == [(0, 0), (1, 2), (2, 1)]
+    assert stats == {'degraded_reason': 'timeout'}
+
+
+def test_match_authors_within_budget_is_not_degraded():
+    rng = random.Random(0)
+    l1 = random_authors(rng, 40)
+    l2 = random_authors(rng, 40)
+    args = (
+        l1,
+        l2,
+        AuthorComparator.threshold,
+        AuthorComparator.distance_function,
+        AuthorComparator.norm_functions,
+        AuthorComparator.id_types,
+    )
+    stats = {}
+
+    result = match_authors(*args, max_pairs=len(l1) * len(l2), timeout=60, stats=stats)
+
+    assert result == match_authors(*args, max_pairs=None)
+    assert stats == {}
+
+
+def test_author_comparator_records_degraded_matching():
+    comparator_class = AuthorComparator.with_author_keys(DEGRADED_L1, DEGRADED_L2)
+    comparator_class.max_distance_pairs = 0
+
+    comparator = comparator_class(DEGRADED_L1, DEGRADED_L2)
+
+    assert comparator.matches == {(0, 0), (1, 2), (2, 1)}
+    assert comparator.degraded_reason == 'max_pairs'
+    assert comparator_class.matching_stats == {'degraded_reason': 'max_pairs'}
+    assert AuthorComparator.matching_stats is None
+    assert AuthorComparator(DEGRADED_L1, DEGRADED_L2).degraded_reason is None
+
+
+def test_author_comparator_get_matches_is_the_same_as_base_comparator():
+    rng = random.Random(0)
+    l1 = random_authors(rng, 30)
+    l2 = random_authors(rng, 30)
+    comparator = AuthorComparator(l1, l2)
+
+    for src, size in (('l1', len(l1)), ('l2', len(l2))):
+        for index in range(size):
+            assert comparator.get_matches(src, index) == BaseComparator.get_matches(
+                comparator, src, index
+            )
+
+    with pytest.raises(ValueError, match='Must have one of'):
+        comparator.get_matches('l3', 0)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+from json_merger.conflict import Conflict
+
+from inspire_json_merger import config
+from inspire_json_merger.comparators import AuthorComparator
+from inspire_json_merger.plan import MergePlan, clear_merge_plans, get_merge_plan
+from inspire_json_merger.utils import filter_conflicts
+
+CONFIGURATIONS = [
+    configuration
+    for configuration in vars(config).values()
+    if isinstance(configuration, type)
+    and issubclass(configuration, config.MergerConfigurationOperations)
+]
+
+
+def test_get_merge_plan_is_cached():
+    clear_merge_plans()
+    plan = get_merge_plan(config.ArxivOnArxivOperations)
+
+    assert get_merge_plan(config.ArxivOnArxivOperations) is plan
+    assert get_merge_plan(config.ArxivOnPublisherOperations) is not plan
+
+    clear_merge_plans()
+    assert get_merge_plan(config.ArxivOnArxivOperations) is not plan
+
+
+def test_merge_plan_reads_configuration():
+    plan = MergePlan(config.ArxivOnArxivOperations)
+
+    assert plan.pre_filters == tuple(config.ArxivOnArxivOperations.pre_filters)
+    merger = plan.get_merger({}, {}, {})
+    assert merger.comparators is config.ArxivOnArxivOperations.comparators
+    assert merger.list_merge_ops is config.ArxivOnArxivOperations.list_merge_ops
+
+
+def test_merge_plan_computes_the_author_keys_once():
+    plan = MergePlan(config.ArxivOnArxivOperations)
+    root = {'authors': [{'full_name': 'Smith, J.'}]}
+    head = {'authors': [{'full_name': 'Smith, J.'}, {'full_name': 'Ellis, J.'}]}
+    update = {'authors': [{'full_name': 'Smith, John'}]}
+
+    merger = plan.get_merger(root, head, update)
+
+    comparator = merger.comparators['authors']
+    assert issubclass(comparator, AuthorComparator)
+    assert len(comparator.author_keys) == 3
+    assert AuthorComparator.author_keys is None
+    comparators = config.ArxivOnArxivOperations.comparators
+    assert merger.comparators['figures'] is comparators['figures']
+
+
+def test_merge_plan_get_filtered_fields():
+    plan = MergePlan(config.ArxivOnArxivOperations)
+
+    assert plan.get_filtered_fields({'authors'}) == {'authors'}
+    assert plan.get_filtered_fields({'authors', 'documents'}) == {
+        'acquisition_source',
+        'authors',
+        'documents',
+        'figures',
+    }
+    assert MergePlan(config.ErratumOnPublisherOperations).get_filtered_fields(
+        {'authors'}
+    ) is None
+
+
+@pytest.mark.parametrize('configuration', CONFIGURATIONS)
+def test_merge_plan_filter_conflicts_matches_filter_conflicts(configuration):
+    conflicts = [
+        Conflict('SET_FIELD', ('authors', 0, 'full_name'), 'Smith, J.'),
+        Conflict('SET_FIELD', ('authors', 1, 'affiliations', 0, 'value'), 'CERN'),
+        Conflict('SET_FIELD', ('authors', 1, 'ids', 0, 'value'), 'J.Smith.1'),
+        Conflict('MANUAL_MERGE', ('_collections',), None),
+        Conflict('REMOVE_FIELD', ('_collections', 0), None),
+        Conflict('SET_FIELD', ('core',), True),
+        Conflict('SET_FIELD', ('titles', 0, 'title'), 'A title'),
+    ]
+
+    expected = filter_conflicts(conflicts, configuration.conflict_filters)
+
+    assert MergePlan(configuration).filter_conflicts(conflicts) == expected
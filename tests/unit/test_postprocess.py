@@ -21,34 +21,42 @@
 # or submit itself to any jurisdiction.
 from __future__ import absolute_import, division, print_function
 
+import pytest
+
 from inspire_json_merger.postprocess import (
+    AuthorPositions,
     _additem,
     _insert_to_list,
     _process_author_manual_merge_conflict,
+    remove_ordering_from_authors_merged,
+    remove_ordering_from_conflicts,
 )
-from inspire_json_merger.utils import ORDER_KEY
 
 
-def test_insert_to_list_when_position_provided_insode_item():
-    item_to_insert = {"full_name": "INSERTED", ORDER_KEY: 1}
+def test_insert_to_list_when_positions_provided():
+    item_to_insert = {"full_name": "INSERTED"}
 
     objects_list = [
-        {"full_name": "First", ORDER_KEY: 0},
-        {"full_name": "Second", ORDER_KEY: 1},
-        {"full_name": "Third", ORDER_KEY: 2},
+        {"full_name": "First"},
+        {"full_name": "Second"},
+        {"full_name": "Third"},
     ]
+    positions = [0, 1, 2]
 
     expected_insert_position = 2
     expected_merged = [
-        {'full_name': 'First', ORDER_KEY: 0},
-        {'full_name': 'Second', ORDER_KEY: 1},
-        {'full_name': 'INSERTED', ORDER_KEY: 1},
-        {'full_name': 'Third', ORDER_KEY: 2},
+        {'full_name': 'First'},
+        {'full_name': 'Second'},
+        {'full_name': 'INSERTED'},
+        {'full_name': 'Third'},
     ]
-    insert_position, merged_objects_list = _insert_to_list(item_to_insert, objects_list)
+    insert_position, merged_objects_list = _insert_to_list(
+        item_to_insert, objects_list, 1, positions
+    )
 
     assert insert_position == expected_insert_position
     assert merged_objects_list == expected_merged
+    assert positions == [0, 1, 1, 2]
 
 
 def test_insert_to_list_when_position_provided_as_parameter():
@@ -57,17 +65,17 @@ def test_insert_to_list_when_position_provided_as_parameter():
     }
 
     objects_list = [
-        {"full_name": "First", ORDER_KEY: 0},
-        {"full_name": "Second", ORDER_KEY: 1},
-        {"full_name": "Third", ORDER_KEY: 2},
+        {"full_name": "First"},
+        {"full_name": "Second"},
+        {"full_name": "Third"},
     ]
 
     expected_insert_position = 2
     expected_merged = [
-        {'full_name': 'First', ORDER_KEY: 0},
-        {'full_name': 'Second', ORDER_KEY: 1},
+        {'full_name': 'First'},
+        {'full_name': 'Second'},
         {'full_name': 'INSERTED'},
-        {'full_name': 'Third', ORDER_KEY: 2},
+        {'full_name': 'Third'},
     ]
     insert_position, merged_objects_list = _insert_to_list(
         item_to_insert, objects_list, 1
@@ -77,73 +85,103 @@ def test_insert_to_list_when_position_provided_as_parameter():
     assert merged_objects_list == expected_merged
 
 
-def test_insert_to_list_when_list_without_order_key_but_item_has_it():
-    item_to_insert = {"full_name": "INSERTED", ORDER_KEY: 1}
+def test_insert_to_list_when_some_elements_are_without_position():
+    item_to_insert = {"full_name": "INSERTED"}
 
     objects_list = [
         {"full_name": "First"},
+        {"full_name": "New"},
         {"full_name": "Second"},
         {"full_name": "Third"},
     ]
+    positions = [0, None, 1, 2]
 
-    expected_insert_position = 2
+    expected_insert_position = 3
     expected_merged = [
         {'full_name': 'First'},
+        {'full_name': 'New'},
         {'full_name': 'Second'},
-        {'full_name': 'INSERTED', ORDER_KEY: 1},
+        {'full_name': 'INSERTED'},
         {'full_name': 'Third'},
     ]
-    insert_position, merged_objects_list = _insert_to_list(item_to_insert, objects_list)
+    insert_position, merged_objects_list = _insert_to_list(
+        item_to_insert, objects_list, 1, positions
+    )
 
     assert insert_position == expected_insert_position
     assert merged_objects_list == expected_merged
+    assert positions == [0, None, 1, 1, 2]
 
 
-def test_insert_to_list_when_item_is_withour_order_key():
+def test_insert_to_list_when_item_is_without_position():
     item_to_insert = {
         "full_name": "INSERTED",
     }
 
     objects_list = [
-        {"full_name": "First", ORDER_KEY: 0},
-        {"full_name": "Second", ORDER_KEY: 1},
-        {"full_name": "Third", ORDER_KEY: 2},
+        {"full_name": "First"},
+        {"full_name": "Second"},
+        {"full_name": "Third"},
     ]
+    positions = [0, 1, 2]
+
     expected_position = 3
     expected_merged = [
-        {"full_name": "First", ORDER_KEY: 0},
-        {"full_name": "Second", ORDER_KEY: 1},
-        {"full_name": "Third", ORDER_KEY: 2},
+        {"full_name": "First"},
+        {"full_name": "Second"},
+        {"full_name": "Third"},
         {"full_name": "INSERTED"},
     ]
-    insert_position, merged_objects_list = _insert_to_list(item_to_insert, objects_list)
+    insert_position, merged_objects_list = _insert_to_list(
+        item_to_insert, objects_list, positions=positions
+    )
 
     assert insert_position == expected_position
     assert merged_objects_list == expected_merged
+    assert positions == [0, 1, 2, None]
 
 
 def test_insert_to_list_when_position_exceeds_lists_elements_count():
-    item_to_insert = {"full_name": "INSERTED", ORDER_KEY: 10}
+    item_to_insert = {"full_name": "INSERTED"}
 
     objects_list = [
-        {"full_name": "First", ORDER_KEY: 0},
-        {"full_name": "Second", ORDER_KEY: 1},
-        {"full_name": "Third", ORDER_KEY: 2},
+        {"full_name": "First"},
+        {"full_name": "Second"},
+        {"full_name": "Third"},
     ]
+    positions = [0, 1, 2]
 
     expected_insert_position = 3
     expected_merged = [
-        {'full_name': 'First', ORDER_KEY: 0},
-        {'full_name': 'Second', ORDER_KEY: 1},
-        {'full_name': 'Third', ORDER_KEY: 2},
-        {'full_name': 'INSERTED', ORDER_KEY: 10},
+        {'full_name': 'First'},
+        {'full_name': 'Second'},
+        {'full_name': 'Third'},
+        {'full_name': 'INSERTED'},
     ]
-    insert_position, merged_objects_list = _insert_to_list(item_to_insert, objects_list)
+    insert_position, merged_objects_list = _insert_to_list(
+        item_to_insert, objects_list, 10, positions
+    )
 
     assert insert_position == expected_insert_position
     assert merged_objects_list == expected_merged
 
 
+def test_author_positions():
+    head_authors = [
+        {"full_name": "First"},
+        {"full_name": "Second"},
+        {"full_name": "First"},
+    ]
+    aligned_head_authors = [head_authors[1], {"full_name": "Update"}, head_authors[2]]
+
+    author_positions = AuthorPositions(head_authors, aligned_head_authors)
+
+    assert author_positions.merged == [1, None, 2]
+    assert author_positions.get({"full_name": "Second"}) == 1
+    assert author_positions.get({"full_name": "First"}) == 0
+    assert author_positions.get({"full_name": "Update"}) is None
+
+
 def test_add_item_on_position():
     item = {"path": "new"}
     object = {"some": [{"path": "1"}, {"path": "2"}, {"path": "3"}]}
@@ -295,3 +333,13 @@ def test_process_author_manual_merge_conflict_when_head_in_conflict_is_none():
     output = _process_author_manual_merge_conflict(conflict, merged)
 
     assert output == expected_output
+
+
+def test_remove_ordering_functions_are_deprecated_noops():
+    conflicts = [{'path': '/authors/0', 'value': {'full_name': 'Smith, J.'}}]
+    merged = {'authors': [{'full_name': 'Smith, J.'}]}
+
+    with pytest.deprecated_call():
+        assert remove_ordering_from_conflicts(conflicts) is conflicts
+    with pytest.deprecated_call():
+        assert remove_ordering_from_authors_merged(merged) is merged
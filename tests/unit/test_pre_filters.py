@@ -22,16 +22,37 @@
 
 from __future__ import absolute_import, division, print_function
 
+import pytest
+from pyrsistent import freeze
+
+from inspire_json_merger import pre_filters
+from inspire_json_merger.config import (
+    ArxivOnArxivOperations,
+    ArxivOnPublisherOperations,
+    PublisherOnArxivOperations,
+    PublisherOnPublisherOperations,
+)
 from inspire_json_merger.pre_filters import (
+    are_references_curated,
     clean_root_for_acquisition_source,
     filter_curated_references,
     filter_documents_same_source,
     filter_figures_same_source,
     filter_publisher_references,
+    get_reference_fingerprint,
+    get_reference_fingerprints,
+    get_references_digest,
+    get_stored_reference_fingerprints,
     remove_root,
+    update_authors_with_ordering_info,
     update_material,
+    uses_fields,
+)
+from inspire_json_merger.utils import (
+    FilterPipeline,
+    filter_records,
+    get_filter_fields,
 )
-from inspire_json_merger.utils import filter_records
 
 
 def test_filter_documents_same_source():
@@ -772,3 +793,236 @@ def test_remove_root():
     assert root == {}
     assert head == head
     assert root == root
+
+
+def test_filter_records_only_freezes_the_fields_of_the_filters():
+    seen = []
+
+    @uses_fields('documents')
+    def filter_(root, head, update):
+        seen.append(set(head))
+        return root, head.remove('documents'), update
+
+    titles = [{'title': 'A title'}]
+    head = {'documents': [{'key': 'file.pdf'}], 'titles': titles, 'core': True}
+
+    root, new_head, update = filter_records({}, head, {}, filters=[filter_])
+
+    assert seen == [{'documents'}]
+    assert new_head == {'titles': titles, 'core': True}
+    assert new_head['titles'] is titles
+    assert list(new_head) == ['titles', 'core']
+    assert root == update == {}
+
+
+def test_filter_records_freezes_everything_with_undeclared_filters():
+    seen = []
+
+    def filter_(root, head, update):
+        seen.append(set(head))
+        return root, head, update
+
+    titles = [{'title': 'A title'}]
+    head = {'documents': [{'key': 'file.pdf'}], 'titles': titles}
+
+    _, new_head, _ = filter_records(
+        {}, head, {}, filters=[filter_documents_same_source, filter_]
+    )
+
+    assert seen == [{'documents', 'titles'}]
+    assert new_head == head
+    assert new_head['titles'] is not titles
+
+
+def test_filter_records_keeps_the_fields_added_by_the_filters():
+    @uses_fields('core')
+    def filter_(root, head, update):
+        return root, head.set('core', True), update
+
+    _, head, _ = filter_records({}, {'titles': []}, {}, filters=[filter_])
+
+    assert head == {'titles': [], 'core': True}
+
+
+def test_pre_filters_of_the_configurations_declare_their_fields():
+    for configuration in (
+        ArxivOnArxivOperations,
+        ArxivOnPublisherOperations,
+        PublisherOnArxivOperations,
+        PublisherOnPublisherOperations,
+    ):
+        assert get_filter_fields(configuration.pre_filters) is not None
+    assert get_filter_fields([remove_root]) is None
+
+
+def test_filter_pipeline_groups_the_filters_sharing_fields():
+    @uses_fields('references')
+    def references_filter(root, head, update):
+        return root, head, update
+
+    pipeline = FilterPipeline(
+        [
+            filter_documents_same_source,
+            references_filter,
+            filter_figures_same_source,
+            clean_root_for_acquisition_source,
+        ]
+    )
+
+    assert sorted(pipeline.groups, key=lambda group: len(group[0])) == [
+        ({'references'}, [references_filter]),
+        (
+            {'documents', 'figures', 'acquisition_source'},
+            [
+                filter_documents_same_source,
+                filter_figures_same_source,
+                clean_root_for_acquisition_source,
+            ],
+        ),
+    ]
+
+
+def test_filter_pipeline_gives_every_group_its_fields():
+    seen = []
+
+    @uses_fields('documents')
+    def documents_filter(root, head, update):
+        seen.append(set(head))
+        return root, head.set('documents', []), update
+
+    @uses_fields('references')
+    def references_filter(root, head, update):
+        seen.append(set(head))
+        return root, head, update
+
+    references = [{'reference': {'title': {'title': 'A title'}}}]
+    head = {'documents': [{'key': 'file.pdf'}], 'references': references}
+    pipeline = FilterPipeline([documents_filter, references_filter])
+
+    _, new_head, _ = pipeline({}, head, {})
+
+    assert sorted(seen, key=sorted) == [{'documents'}, {'references'}]
+    assert new_head == {'documents': [], 'references': references}
+    assert new_head['references'] is references
+
+
+def test_get_reference_fingerprint_ignores_the_uncurated_parts():
+    reference = {
+        'reference': {
+            'title': {'title': 'A title'},
+            'publication_info': {'journal_title': 'JHEP', 'year': 2020},
+        },
+        'curated_relation': True,
+    }
+    uncurated = {
+        'record': {'$ref': 'https://inspirehep.net/api/literature/1'},
+        'raw_refs': [{'schema': 'text', 'value': 'A title, JHEP 2020'}],
+        'reference': {
+            'publication_info': {'year': 2020, 'journal_title': 'JHEP'},
+            'title': {'title': 'A title'},
+            'misc': ['A title'],
+            'authors': [{'full_name': 'Smith, J.'}],
+        },
+        'curated_relation': True,
+    }
+
+    fingerprint = get_reference_fingerprint(reference)
+
+    assert get_reference_fingerprint(uncurated) == fingerprint
+    assert get_reference_fingerprint(freeze(uncurated)) == fingerprint
+    assert get_reference_fingerprint(dict(reference, curated_relation=False)) != (
+        fingerprint
+    )
+    assert get_reference_fingerprint({'curated_relation': False}) == (
+        get_reference_fingerprint({'reference': {'misc': ['A title']}})
+    )
+
+
+def test_are_references_curated_stops_at_the_first_difference(monkeypatch):
+    fingerprinted = []
+
+    def get_fingerprint(reference):
+        fingerprinted.append(reference)
+        return get_reference_fingerprint(reference)
+
+    monkeypatch.setattr(pre_filters, 'get_reference_fingerprint', get_fingerprint)
+    root_refs = freeze(
+        [{'reference': {'title': {'title': 'Title %d' % i}}} for i in range(10)]
+    )
+    head_refs = root_refs.set(1, freeze({'reference': {'title': {'title': 'New'}}}))
+
+    assert are_references_curated(root_refs, head_refs)
+    assert len(fingerprinted) == 4
+    assert not are_references_curated(root_refs, root_refs)
+
+
+def test_filter_curated_references_uses_the_given_fingerprints(monkeypatch):
+    def get_fingerprint(reference):
+        raise AssertionError('fingerprint computed')
+
+    references = [{'reference': {'title': {'title': 'A title'}}}]
+    curated_references = [{'reference': {'title': {'title': 'Curated'}}}]
+    root = {'references': references}
+    head = {'references': references}
+    update = {'references': [{'reference': {'title': {'title': 'New'}}}]}
+    fingerprints = {
+        'root': get_reference_fingerprints(references),
+        'root_digest': get_references_digest(references),
+        'head': get_reference_fingerprints(curated_references),
+        'head_digest': get_references_digest(references),
+    }
+    monkeypatch.setattr(pre_filters, 'get_reference_fingerprint', get_fingerprint)
+
+    result = filter_records(
+        root,
+        head,
+        update,
+        filters=[filter_curated_references],
+        reference_fingerprints=fingerprints,
+    )
+
+    assert result == ({}, head, {})
+
+
+def test_are_references_curated_ignores_fingerprints_of_other_references():
+    root_refs = freeze([{'reference': {'title': {'title': 'A title'}}}])
+    head_refs = freeze([{'reference': {'title': {'title': 'Curated'}}}])
+    stale_fingerprints = {
+        'root': get_reference_fingerprints(root_refs),
+        'root_digest': get_references_digest(root_refs),
+        'head': get_reference_fingerprints(root_refs),
+        'head_digest': get_references_digest(root_refs),
+    }
+
+    assert are_references_curated(root_refs, head_refs, stale_fingerprints)
+    assert are_references_curated(root_refs, head_refs, {'root': [], 'head': []})
+
+
+def test_get_stored_reference_fingerprints():
+    references = [{'reference': {'title': {'title': 'A title'}}, 'raw_refs': []}]
+    fingerprints = get_reference_fingerprints(references)
+    stored = {'head': fingerprints, 'head_digest': get_references_digest(references)}
+    # The raw_refs aren't part of the fingerprints, but are of the digest.
+    edited = [dict(references[0], raw_refs=[{'value': 'A title'}])]
+
+    assert get_stored_reference_fingerprints(stored, 'head', references) == (
+        fingerprints
+    )
+    assert get_stored_reference_fingerprints(stored, 'head', freeze(references)) == (
+        fingerprints
+    )
+    assert get_stored_reference_fingerprints(stored, 'head', edited) is None
+    assert get_stored_reference_fingerprints(stored, 'root', references) is None
+    assert (
+        get_stored_reference_fingerprints({'head': fingerprints}, 'head', references)
+        is None
+    )
+    assert get_stored_reference_fingerprints(None, 'head', references) is None
+
+
+def test_update_authors_with_ordering_info_is_a_deprecated_noop():
+    record = freeze({'authors': [{'full_name': 'Smith, J.'}]})
+    records = (record, record, record)
+
+    with pytest.deprecated_call():
+        assert update_authors_with_ordering_info(*records) == records